@@ -0,0 +1,234 @@
+"""
+得力 E+ 签到流程的声明式状态机：命令行（deliSignup）和 GUI 共用同一份流程定义和执行引擎
+- 每个 Step 是一个状态：执行动作，按动作返回值在 transitions 中选择下一个状态，未列出时进入 next
+- when 为假的可选步骤不执行，以 "skipped" 作为返回值继续转移
+- timeout 从首次进入该状态开始计时，用于刷新、等待结果这类循环状态
+"""
+
+from time import time, sleep
+
+from Locator import Locators
+from Screen import ScreenState, detect_state, detect_range
+
+END = None  # 转移到 END 表示流程结束
+SKIPPED = "skipped"
+BACK_AFTER = 8  # 未识别的页面保持不变超过该秒数才按返回键
+
+
+class Step:
+    """流程中的一个状态
+
+    Args:
+        name: 状态名
+        label: 进度提示，可引用上下文字段，如 "输入账号: {username}"
+        action: action(deli, ctx)，返回值用于选择下一个状态
+        next: 返回值不在 transitions 中时的下一个状态
+        transitions: 动作返回值 -> 下一个状态
+        when: when(deli) 为假时跳过该步骤
+        timeout: 首次进入后超过该秒数仍停留在此状态时抛出 TimeoutError
+        progress: 该步骤在单个用户签到中的进度序号（GUI 进度条使用）
+    """
+
+    def __init__(self, name: str, label: str, action, next: str | None = END, transitions: dict = None,
+                 when=None, timeout: float = None, timeout_message: str = "", progress: int = 0):
+        self.name = name
+        self.label = label
+        self.action = action
+        self.next = next
+        self.transitions = transitions or {}
+        self.when = when
+        self.timeout = timeout
+        self.timeout_message = timeout_message or f"{label}超时"
+        self.progress = progress
+
+    def __repr__(self):
+        return f"Step({self.name})"
+
+
+class Flow:
+    """由若干 Step 组成的流程，从 start 状态开始执行"""
+
+    def __init__(self, name: str, start: str, steps: list[Step]):
+        self.name = name
+        self.start = start
+        self.steps = {step.name: step for step in steps}
+        for step in steps:
+            for target in [step.next, *step.transitions.values()]:
+                if target is not END and target not in self.steps:
+                    raise ValueError(f"流程 {name} 的状态 {step.name} 转移到未定义的状态 {target}")
+
+
+class FlowEngine:
+    """执行流程：每进入一个状态先检查停止请求和超时，再回调 on_step 报告进度"""
+
+    def __init__(self, deli):
+        self.deli = deli
+        self.on_step = None  # on_step(step, ctx)，GUI 用于更新进度
+
+    def run(self, flow: Flow, ctx: dict) -> list[str]:
+        """执行流程直到转移到 END，返回经过的状态名"""
+        entered = {}
+        path = []
+        name = flow.start
+        while name is not END:
+            step = flow.steps[name]
+            self.deli._check_stop()
+            now = time()
+            if step.timeout is not None and now - entered.setdefault(name, now) > step.timeout:
+                self.deli.log.error(step.timeout_message)
+                raise TimeoutError(step.timeout_message)
+            if step.when is not None and not step.when(self.deli):
+                self.deli.log.info(f"跳过步骤: {step.label.format(**ctx)}")
+                outcome = SKIPPED
+            else:
+                if self.on_step is not None:
+                    self.on_step(step, ctx)
+                outcome = step.action(self.deli, ctx)
+            path.append(name)
+            name = step.transitions.get(outcome, step.next)
+        return path
+
+
+# ==================== 动作 ====================
+
+def _click(locator):
+    def action(deli, ctx):
+        deli.emulator.wait(locator).click()
+    return action
+
+
+def _click_now(locator):
+    """页面已由识别结果确认，元素不需要等待"""
+    def action(deli, ctx):
+        deli.emulator.wait(locator, timeout=0).click()
+    return action
+
+
+def _type_into(deli, locator, text: str, what: str, attempts: int = 2):
+    """点击输入框并输入文本，输入确认失败时重新聚焦再试，仍失败时抛出 RuntimeError"""
+    for _ in range(attempts):
+        field = deli.emulator.wait(locator)
+        field.click()
+        if field.send_keys(text):
+            return
+    raise RuntimeError(f"输入{what}失败")
+
+
+def _enter_phone(deli, ctx):
+    _type_into(deli, Locators.PHONE, ctx["username"], "账号")
+
+
+def _enter_password(deli, ctx):
+    _type_into(deli, Locators.PASSWORD, ctx["password"], "密码")
+
+
+def _apply_location(deli, ctx):
+    deli.apply_location(ctx["username"])
+
+
+def _detect_range(deli, ctx):
+    # 先用截图快速识别横幅；未启用或不确定时两个候选状态在同一份快照上竞争，先出现者胜出
+    matched = detect_range(deli.emulator, deli.detector) if deli.detector is not None else None
+    if matched is None:
+        matched, _ = deli.emulator.wait_any([Locators.IN_RANGE, Locators.OUT_OF_RANGE], timeout=3)
+    return matched
+
+
+def _refresh(deli, ctx):
+    deli.emulator.wait(Locators.REFRESH).click()
+    # 刷新后界面几乎不变，等到层级真正变化再判断，而不是空转探测
+    deli.emulator.wait_change(timeout=3)
+
+
+def _wait_result(deli, ctx):
+    result, _ = deli.emulator.wait_any(list(Locators.RESULTS.values()), timeout=3)
+    if result is not None:
+        ctx["result"] = result.value
+        deli.log.info(f"签到结果: {result.value}")
+    return result
+
+
+def _logout(deli, ctx):
+    # 退出登录期间在后台为下一个用户预设虚拟位置
+    deli.prefetch_location(deli.next_user)
+    deli.logout()
+
+
+def _detect_screen(deli, ctx):
+    # 每轮只 dump 一次层级，一次遍历识别当前页面后直接分支
+    state = detect_state(deli.emulator, deli.detector)
+    if state is not ScreenState.UNKNOWN:
+        ctx.pop("unknown_since", None)
+    return state
+
+
+def _dismiss_invalid(deli, ctx):
+    deli.emulator.wait(Locators.CONFIRM, timeout=0).click()
+    deli.check_login_invaild_done = True
+
+
+def _logout_home(deli, ctx):
+    deli.logout(check_invalid=True)
+
+
+def _back_off(deli, ctx):
+    """未识别的页面：应用已退到桌面时重新拉起；界面仍在变化（加载中）时继续识别；
+    保持不变超过 BACK_AFTER 秒且不是应用的启动页（Logo、加载页，按返回键会直接退出应用）时才按返回键"""
+    emulator = deli.emulator
+    package = deli.deli_package_name
+    if emulator._foreground_package() != package:
+        deli.log.warning(f"应用不在前台，重新启动: {package}")
+        emulator.start_app(package, timeout=30)
+        ctx.pop("unknown_since", None)
+        return
+    if emulator.wait_change(timeout=1) is not None:
+        ctx.pop("unknown_since", None)
+        return
+    since = ctx.setdefault("unknown_since", time())
+    if time() - since < BACK_AFTER or emulator.foreground_activity() == emulator.launch_activity(package):
+        return
+    emulator.press_keys(["KEYCODE_BACK"])
+    ctx.pop("unknown_since", None)
+    sleep(0.5)
+
+
+# ==================== 流程定义 ====================
+
+# 启动后处理广告、登录失效、已登录主页等页面，直到出现登录表单
+STARTUP = Flow("startup", "detect", [
+    Step("detect", "识别当前页面", _detect_screen, next="detect",
+         timeout=60, timeout_message="处理启动页面超时，未能回到登录页", transitions={
+        ScreenState.LOGIN_INVALID: "dismiss_invalid",
+        ScreenState.SPLASH: "skip_splash",
+        ScreenState.HOME: "logout",
+        ScreenState.ATTENDANCE: "logout",  # 考勤页底部有“我的”标签，直接走退出登录
+        ScreenState.RESULT: "close_result",
+        ScreenState.UNKNOWN: "back_off",
+        ScreenState.LOGIN: END,
+    }),
+    Step("dismiss_invalid", "关闭登录失效提示", _dismiss_invalid, next="detect"),
+    Step("skip_splash", "跳过启动广告", _click_now(Locators.SKIP), next="detect"),
+    Step("logout", "退出已登录账号", _logout_home, next="detect"),
+    Step("close_result", "关闭打卡结果", _click(Locators.CLOSE), next="detect"),
+    Step("back_off", "返回上一页", _back_off, next="detect"),
+])
+
+# 单个用户签到：从登录表单开始，退出登录后回到登录表单结束
+SIGNIN = Flow("signin", "phone", [
+    Step("phone", "输入账号: {username}", _enter_phone, next="password", progress=1),
+    Step("password", "输入密码...", _enter_password, next="login", progress=2),
+    Step("login", "点击登录按钮...", _click(Locators.LOGIN), next="location", progress=3),
+    Step("location", "设置虚拟定位...", _apply_location, next="agree", progress=4),
+    Step("agree", "同意协议并继续...", _click(Locators.AGREE), next="attendance", progress=5),
+    Step("attendance", "进入智能考勤...", _click(Locators.ATTENDANCE), next="range", progress=6),
+    Step("range", "等待打卡范围检测...", _detect_range, next="range", progress=7,
+         transitions={Locators.IN_RANGE: "punch", Locators.OUT_OF_RANGE: "refresh"},
+         timeout=90, timeout_message="签到超时，请检查模拟器定位经纬度"),
+    Step("refresh", "不在打卡范围内，刷新位置...", _refresh, next="range", progress=7),
+    Step("punch", "执行打卡...", _click(Locators.PUNCH), next="result", progress=7,
+         when=lambda deli: not deli.debugmode, transitions={SKIPPED: "logout"}),
+    Step("result", "等待打卡结果...", _wait_result, next="close", progress=7,
+         transitions={None: "result"}, timeout=60, timeout_message="等待打卡结果超时"),
+    Step("close", "关闭打卡结果...", _click(Locators.CLOSE), next="logout", progress=7),
+    Step("logout", "退出当前账号...", _logout, progress=8),
+])
@@ -0,0 +1,130 @@
+"""
+得力 E+ 界面元素注册表：每个 UI 目标只定义一次（名称、xpath、默认超时）
+- 根据 xpath 自动选择最便宜的匹配方式：resource-id / 文本走快照索引的字典查找，其余回退到通用 xpath
+- 记录每个选择器的匹配耗时和等待耗时，便于找出慢选择器
+"""
+
+import re
+from threading import Lock
+from time import perf_counter
+
+PACKAGE = "com.delicloud.app.smartoffice"
+
+_RESOURCE_ID_RE = re.compile(r"^//([\w.]+|\*)\[@resource-id='([^']+)'\]$")
+_TEXT_RE = re.compile(r"^//([\w.]+|\*)\[@text='([^']+)'\]$")
+
+
+class Locator:
+    """单个界面元素定义
+
+    strategy 由 xpath 自动推导：
+        resource-id  //cls[@resource-id='x']  按 resource-id 索引查找
+        class+text   //cls[@text='x']         按文本索引查找后过滤 class
+        text         //*[@text='x']           按文本索引查找
+        xpath        其他写法                  编译后在整棵树上执行
+    """
+
+    def __init__(self, name: str, xpath: str, timeout: float = 5):
+        self.name = name
+        self.xpath = xpath
+        self.timeout = timeout
+        self.strategy, self.cls, self.value = self._plan(xpath)
+        self.stats = {
+            "match_count": 0, "match_time": 0.0,
+            "wait_count": 0, "wait_time": 0.0, "wait_max": 0.0, "wait_miss": 0,
+        }
+        self._lock = Lock()  # 多实例并行签到时多个线程同时更新 stats
+
+    @staticmethod
+    def _plan(xpath: str) -> tuple[str, str | None, str]:
+        m = _RESOURCE_ID_RE.match(xpath)
+        if m:
+            return "resource-id", None if m.group(1) == "*" else m.group(1), m.group(2)
+        m = _TEXT_RE.match(xpath)
+        if m:
+            if m.group(1) == "*":
+                return "text", None, m.group(2)
+            return "class+text", m.group(1), m.group(2)
+        return "xpath", None, xpath
+
+    def __str__(self):
+        return self.xpath
+
+    def __repr__(self):
+        return f"Locator({self.name!r}, strategy={self.strategy!r})"
+
+    def match(self, snap):
+        """在快照上查找第一个匹配节点，不存在返回 None"""
+        start = perf_counter()
+        if self.strategy == "resource-id":
+            nodes = snap.by_resource_id.get(self.value, [])
+        elif self.strategy in ("text", "class+text"):
+            nodes = snap.by_text.get(self.value, [])
+        else:
+            node = snap.find(self.xpath)
+            nodes = [node] if node is not None else []
+        if self.cls is not None:
+            nodes = [n for n in nodes if n.tag == self.cls]
+        elapsed = perf_counter() - start
+        with self._lock:
+            self.stats["match_count"] += 1
+            self.stats["match_time"] += elapsed
+        return nodes[0] if nodes else None
+
+    def record_wait(self, seconds: float, found: bool):
+        """记录一次等待耗时"""
+        with self._lock:
+            self.stats["wait_count"] += 1
+            self.stats["wait_time"] += seconds
+            self.stats["wait_max"] = max(self.stats["wait_max"], seconds)
+            if not found:
+                self.stats["wait_miss"] += 1
+
+
+def _text(name: str, text: str, timeout: float = 5, cls: str = "android.widget.TextView") -> Locator:
+    return Locator(name, f"//{cls}[@text='{text}']", timeout)
+
+
+def _rid(name: str, rid: str, cls: str, timeout: float = 5) -> Locator:
+    return Locator(name, f"//{cls}[@resource-id='{PACKAGE}:id/{rid}']", timeout)
+
+
+class Locators:
+    """签到流程用到的全部界面元素"""
+
+    SKIP = _text("skip", "跳过", timeout=0.5)
+    MINE = _text("mine", "我的")
+    SETTINGS = _text("settings", "设置")
+    LOGOUT = _text("logout", "退出登录")
+    CONFIRM = _text("confirm", "确定")
+    LOGIN = _text("login", "登录")
+    PHONE = _rid("phone", "et_phone", "android.widget.EditText")
+    PASSWORD = _rid("password", "et_password", "android.widget.EditText")
+    AGREE = _text("agree", "同意并继续")
+    ATTENDANCE = _text("attendance", "智能考勤")
+    IN_RANGE = _text("in_range", "已在打卡范围内", timeout=0.3)
+    OUT_OF_RANGE = _text("out_of_range", "不在打卡范围内", timeout=0.3)
+    REFRESH = _text("refresh", "刷新", timeout=0.1)
+    PUNCH = _text("punch", "打卡", timeout=0.3)
+    CLOSE = _rid("close", "iv_close", "android.widget.ImageView", timeout=0.3)
+    RESULTS = {
+        text: _text(f"result_{i}", text, timeout=0.1)
+        for i, text in enumerate(['打卡成功', '签到成功', '签退成功', '迟到', '早退'])
+    }
+
+    @classmethod
+    def all(cls) -> list[Locator]:
+        """返回注册表中的全部元素"""
+        items = [v for v in vars(cls).values() if isinstance(v, Locator)]
+        return items + list(cls.RESULTS.values())
+
+    @classmethod
+    def slowest(cls, limit: int = 5) -> list[tuple[str, float, float, int]]:
+        """按平均等待耗时排序，返回 (名称, 平均等待秒数, 最长等待秒数, 等待次数)"""
+        rows = []
+        for loc in cls.all():
+            st = loc.stats
+            if st["wait_count"]:
+                rows.append((loc.name, st["wait_time"] / st["wait_count"], st["wait_max"], st["wait_count"]))
+        rows.sort(key=lambda r: r[1], reverse=True)
+        return rows[:limit]
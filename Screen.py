@@ -0,0 +1,247 @@
+"""
+得力 E+ 页面识别：对一次 UI 层级快照做指纹匹配，一次遍历判断当前所处页面
+替代启动循环中逐个 wait(...).exists() 的级联探测
+
+可选的截图识别快速路径：对缩小后的截图计算差值哈希（dHash），与已学习的参考哈希比对，
+不确定时回退到层级快照，并用层级识别结果继续学习参考哈希
+"""
+
+import json
+import os
+import re
+import tempfile
+from enum import Enum
+from threading import Lock
+
+from PIL import Image
+
+from emulator.mumu import UISnapshot
+from Locator import Locator, Locators
+from Setting import CONFIG_PATH
+
+
+class ScreenState(Enum):
+    """已知页面状态"""
+    UNKNOWN = "unknown"
+    SPLASH = "splash"                # 启动广告页（跳过）
+    HOME = "home"                    # 已登录主页（我的）
+    LOGIN = "login"                  # 登录表单
+    LOGIN_INVALID = "login_invalid"  # 登录失效提示弹窗（确定）
+    ATTENDANCE = "attendance"        # 智能考勤打卡页
+    RESULT = "result"                # 打卡结果弹窗
+
+
+def _fingerprint(any_of: list[Locator], excludes: list[Locator] = ()) -> dict:
+    """由注册表中的元素生成指纹：resource-id 元素按 resource-id 索引匹配，文本元素按文本索引匹配"""
+    return {
+        "texts": [loc.value for loc in any_of if loc.strategy != "resource-id"],
+        "resource_ids": [loc.value for loc in any_of if loc.strategy == "resource-id"],
+        "excludes": [loc.value for loc in excludes],
+    }
+
+
+RESULT_TEXTS = list(Locators.RESULTS)
+
+# 页面指纹：texts / resource_ids 中任一命中即匹配，excludes 中任一出现则不匹配
+# 按顺序判断，弹窗类状态排在页面类状态之前；文本和 resource-id 都取自 Locators，与流程中等待的元素保持一致
+FINGERPRINTS = [
+    (ScreenState.RESULT, _fingerprint(list(Locators.RESULTS.values()))),
+    (ScreenState.LOGIN_INVALID, _fingerprint([Locators.CONFIRM], excludes=[Locators.LOGOUT, Locators.SETTINGS])),
+    (ScreenState.SPLASH, _fingerprint([Locators.SKIP])),
+    (ScreenState.ATTENDANCE, _fingerprint([Locators.IN_RANGE, Locators.OUT_OF_RANGE])),
+    (ScreenState.LOGIN, _fingerprint([Locators.LOGIN, Locators.PHONE, Locators.PASSWORD])),
+    (ScreenState.HOME, _fingerprint([Locators.MINE])),
+]
+
+
+def classify(snap: UISnapshot) -> ScreenState:
+    """根据快照判断当前页面，所有指纹共用快照的一次遍历索引"""
+    texts = snap.by_text
+    resource_ids = snap.by_resource_id
+    for state, fp in FINGERPRINTS:
+        if any(t in texts for t in fp["excludes"]):
+            continue
+        if any(t in texts for t in fp["texts"]) or any(r in resource_ids for r in fp["resource_ids"]):
+            return state
+    return ScreenState.UNKNOWN
+
+
+class ScreenDetector:
+    """截图感知哈希识别器：标签 -> 参考列表，参考由层级识别结果自动学习并持久化
+
+    每个参考为 (区域, 哈希)：区域为 None 时对整张截图取哈希，否则只对该区域（相对屏幕的比例坐标）取哈希，
+    用于只有小块横幅不同的页面。同一标签的相近哈希被层级识别确认两次后才成为参考，
+    避免截图与 dump 之间界面变化导致学错
+    """
+
+    DEFAULT_PATH = os.path.join(os.path.dirname(CONFIG_PATH), "screen_hashes.json")
+    MAX_PENDING = 32
+    _lock = Lock()  # 并行签到的多个识别器共用同一个参考文件，学习和写入串行进行
+
+    def __init__(self, path: str = None, size: int = 16, threshold: int = 12, margin: int = 8):
+        self.path = path
+        self.size = size
+        self.threshold = threshold  # 汉明距离不超过该值视为同一页面
+        self.margin = margin        # 最近标签需比其他候选标签近出该距离才算确定
+        self._pending: list[tuple[str, tuple | None, int]] = []
+        self.references: dict[str, list[tuple[tuple | None, int]]] = self._load()
+
+    def _load(self) -> dict[str, list[tuple[tuple | None, int]]]:
+        """读取参考文件，文件不存在、损坏或哈希尺寸不同时返回空参考"""
+        if not self.path or not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("size") != self.size:
+                return {}
+            return {
+                label: [(tuple(ref["box"]) if ref["box"] else None, int(ref["hash"], 16)) for ref in refs]
+                for label, refs in data["references"].items()
+            }
+        except (json.JSONDecodeError, KeyError, TypeError, ValueError, OSError):
+            return {}
+
+    def dhash(self, image: Image.Image, box: tuple | None = None) -> int:
+        """差值哈希：可选裁剪到 box，灰度缩放到 (size+1)×size，逐行比较相邻像素"""
+        if box is not None:
+            w, h = image.size
+            image = image.crop((int(box[0] * w), int(box[1] * h), max(int(box[2] * w), 1), max(int(box[3] * h), 1)))
+        gray = image.convert("L").resize((self.size + 1, self.size), Image.Resampling.BILINEAR)
+        px = gray.tobytes()
+        bits = 0
+        for row in range(self.size):
+            base = row * (self.size + 1)
+            for col in range(self.size):
+                bits = (bits << 1) | (px[base + col] < px[base + col + 1])
+        return bits
+
+    def _distances(self, image: Image.Image, labels) -> list[tuple[int, str]]:
+        """各候选标签与截图的最小汉明距离，升序"""
+        hashes = {}
+        rows = []
+        for label in labels:
+            refs = self.references.get(label)
+            if not refs:
+                continue
+            best = None
+            for box, ref in refs:
+                if box not in hashes:
+                    hashes[box] = self.dhash(image, box)
+                d = (hashes[box] ^ ref).bit_count()
+                best = d if best is None else min(best, d)
+            rows.append((best, label))
+        return sorted(rows)
+
+    def detect(self, image: Image.Image, labels: list[str], require_all: bool = False) -> str | None:
+        """返回确定匹配的候选标签，不确定时返回 None
+
+        require_all 为 True 时所有候选标签都学到参考后才给出结果，用于彼此只差一小块区域的页面
+        """
+        if require_all and not all(self.references.get(label) for label in labels):
+            return None
+        rows = self._distances(image, labels)
+        if not rows or rows[0][0] > self.threshold:
+            return None
+        if len(rows) > 1 and rows[1][0] - rows[0][0] < self.margin:
+            return None
+        return rows[0][1]
+
+    def learn(self, label: str, image: Image.Image, labels: list[str], box: tuple | None = None):
+        """记录层级识别确认的标签，相近哈希第二次被确认时加入参考"""
+        rows = self._distances(image, labels)
+        if rows and rows[0][0] <= self.threshold:
+            return  # 已能识别，或与其他候选标签的参考冲突
+        h = self.dhash(image, box)
+        for i, (pending_label, pending_box, pending) in enumerate(self._pending):
+            if pending_label == label and pending_box == box and (h ^ pending).bit_count() <= self.threshold:
+                del self._pending[i]
+                with self._lock:
+                    self.references.setdefault(label, []).append((box, h))
+                self.save()
+                return
+        self._pending = (self._pending + [(label, box, h)])[-self.MAX_PENDING:]
+
+    def save(self):
+        """与文件中已有的参考合并后写入（并行签到时其他识别器学到的参考不会被覆盖）
+
+        先写临时文件再替换，写入中途中断或并发写入时不会留下损坏的参考文件
+        """
+        if not self.path:
+            return
+        with self._lock:
+            merged = self._load()
+            for label, refs in self.references.items():
+                known = merged.setdefault(label, [])
+                known.extend(ref for ref in refs if ref not in known)
+            self.references = merged
+            data = {
+                "size": self.size,
+                "references": {
+                    label: [{"box": list(box) if box else None, "hash": f"{h:x}"} for box, h in refs]
+                    for label, refs in self.references.items()
+                },
+            }
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.path)), suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump(data, f, indent=2)
+                os.replace(tmp, self.path)
+            except BaseException:
+                os.remove(tmp)
+                raise
+
+
+def _box(snap: UISnapshot, node) -> tuple[float, float, float, float]:
+    """节点 bounds 相对屏幕（根节点 bounds）的比例坐标"""
+    screen = next(iter(snap.root), None)
+    sx1, sy1, sx2, sy2 = map(int, re.findall(r"\d+", screen.attrib.get("bounds", "[0,0][1,1]")))
+    x1, y1, x2, y2 = map(int, re.findall(r"\d+", node.attrib.get("bounds", "[0,0][0,0]")))
+    w, h = max(sx2 - sx1, 1), max(sy2 - sy1, 1)
+    return (round((x1 - sx1) / w, 4), round((y1 - sy1) / h, 4), round((x2 - sx1) / w, 4), round((y2 - sy1) / h, 4))
+
+
+def _detect(emulator, detector: ScreenDetector | None, fallback, labels: list[str],
+            require_all: bool = False) -> str | None:
+    """先用截图识别，不确定时对层级快照调用 fallback(snap) 得到 (标签, 区域)，并用该结果训练识别器"""
+    image = None
+    if detector is not None:
+        try:
+            image = emulator.screenshot_small()
+        except Exception:
+            image = None
+        if image is not None:
+            label = detector.detect(image, labels, require_all)
+            if label is not None:
+                return label
+    label, box = fallback(emulator.snapshot())
+    if image is not None and label is not None:
+        detector.learn(label, image, labels, box)
+    return label
+
+
+def detect_state(emulator, detector: ScreenDetector | None = None) -> ScreenState:
+    """识别当前页面（整屏哈希）；detector 为 None 时等同于 classify(emulator.snapshot())"""
+    labels = [state.value for state in ScreenState if state is not ScreenState.UNKNOWN]
+
+    def fallback(snap):
+        state = classify(snap)
+        return (None if state is ScreenState.UNKNOWN else state.value), None
+
+    label = _detect(emulator, detector, fallback, labels)
+    return ScreenState(label) if label is not None else ScreenState.UNKNOWN
+
+
+def detect_range(emulator, detector: ScreenDetector | None = None):
+    """识别考勤页的打卡范围横幅（横幅区域哈希），返回 Locators.IN_RANGE / Locators.OUT_OF_RANGE，均未出现返回 None"""
+    candidates = {loc.name: loc for loc in (Locators.IN_RANGE, Locators.OUT_OF_RANGE)}
+
+    def fallback(snap):
+        for name, loc in candidates.items():
+            node = snap.find(loc)
+            if node is not None:
+                return name, _box(snap, node)
+        return None, None
+
+    label = _detect(emulator, detector, fallback, list(candidates), require_all=True)
+    return candidates.get(label)
@@ -21,9 +21,15 @@ DEFAULT_CONFIG = {
     "serial": "127.0.0.1:16384",
     "emulator_path": "",
     "emulator_num": "0",
+    "backend": "auto",  # 模拟器后端 mumu / adb / fake，auto 按 emulator_path 识别；多实例时可按 serial 顺序配置列表
+    "replay_scenario": "",  # fake 后端的回放场景目录，默认使用 debug/replay/eplus
     "location": {"latitude": 45, "longitude": 45},
+    "user_locations": {},  # 可选，用户名 -> 单独的虚拟位置，未配置的用户使用 location
     "users": {},
-    "debugmode": False
+    "debugmode": False,
+    "screen_detector": False,  # 是否启用截图哈希识别快速路径
+    "warm_instances": 0,  # GUI 运行期间保持开机的模拟器实例数，0 表示不保温
+    "health_interval": 60  # 保温实例的健康检查间隔（秒）
 }
 
 
@@ -59,6 +65,15 @@ def reload_config():
         setattr(Setting, key, value)
 
 
+def _as_list(value) -> list[str]:
+    """配置项可以是单个值、列表或逗号分隔的字符串，统一转为字符串列表"""
+    if isinstance(value, (list, tuple)):
+        items = value
+    else:
+        items = str(value).split(",")
+    return [str(v).strip() for v in items if str(v).strip()]
+
+
 class Setting:
     """兼容原有接口，类属性由 reload_config() 动态设置"""
 
@@ -66,6 +81,29 @@ class Setting:
     def reload(cls):
         reload_config()
 
+    @classmethod
+    def instances(cls) -> list[tuple[str, str]]:
+        """返回模拟器实例列表 [(serial, emulator_num), ...]
+
+        serial 与 emulator_num 均可配置为列表（或逗号分隔的字符串），按位置一一对应
+        """
+        serials = _as_list(cls.serial)
+        nums = _as_list(cls.emulator_num)
+        if len(serials) != len(nums) or not serials:
+            raise ValueError(f"serial 与 emulator_num 数量不一致: {len(serials)} / {len(nums)}")
+        return list(zip(serials, nums))
+
+    @classmethod
+    def backends(cls) -> list[str]:
+        """返回与 instances() 一一对应的后端名，只配置一个时所有实例共用"""
+        names = _as_list(cls.backend) or ["auto"]
+        count = len(cls.instances())
+        if len(names) == 1:
+            return names * count
+        if len(names) != count:
+            raise ValueError(f"backend 与 serial 数量不一致: {len(names)} / {count}")
+        return names
+
 
 # 初次加载
 reload_config()
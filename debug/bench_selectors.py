@@ -0,0 +1,174 @@
+"""
+选择器匹配基准测试
+加载 dump_ui_hierarchy.py 导出的 UI 层级 XML，统计解析、选择器匹配和页面识别的耗时
+结果输出为 JSON，可与上一次结果对比以发现性能回退
+
+用法:
+    python bench_selectors.py                          # 默认语料: xml/ 与 replay/eplus/
+    python bench_selectors.py -d path/to/xml -n 200 -o result.json
+    python bench_selectors.py --baseline result.json   # 与基线对比，回退时返回码为 1
+"""
+
+import os
+import sys
+import json
+import glob
+import platform
+import argparse
+import statistics
+from datetime import datetime
+from time import perf_counter
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.abspath(os.path.join(SCRIPT_DIR, "..", "Deli_EPlus_AutoSignUp"))
+if not os.path.isdir(PROJECT_DIR):
+    PROJECT_DIR = os.path.dirname(SCRIPT_DIR)
+sys.path.insert(0, PROJECT_DIR)
+
+DEFAULT_CORPUS = [os.path.join(SCRIPT_DIR, "xml"), os.path.join(SCRIPT_DIR, "replay", "eplus")]
+
+
+def load_corpus(dirs: list[str]) -> dict[str, str]:
+    """读取目录下所有 XML 文件，返回 文件名 -> 内容"""
+    corpus = {}
+    for d in dirs:
+        for path in sorted(glob.glob(os.path.join(d, "*.xml"))):
+            with open(path, "r", encoding="utf-8") as f:
+                corpus[os.path.relpath(path, SCRIPT_DIR)] = f.read()
+    return corpus
+
+
+def _timeit(func, repeat: int, setup=None) -> list[float]:
+    """执行 repeat 次并记录每次耗时，setup 在每次计时前执行且不计入耗时"""
+    samples = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = perf_counter()
+        func()
+        samples.append(perf_counter() - start)
+    return samples
+
+
+def _summary(samples: list[float]) -> dict:
+    """汇总耗时样本（微秒）"""
+    samples = sorted(samples)
+    return {
+        "count": len(samples),
+        "mean_us": round(statistics.fmean(samples) * 1e6, 3),
+        "median_us": round(statistics.median(samples) * 1e6, 3),
+        "p95_us": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1e6, 3),
+    }
+
+
+def run_benchmark(corpus: dict[str, str], repeat: int) -> dict:
+    """对语料中每个层级执行解析、建索引、逐个选择器匹配和页面识别
+
+    Locator.match 会累计选择器统计，基准结束后恢复为运行前的值，不影响同一进程中的签到报告
+    """
+    from emulator.mumu import UISnapshot, SelectorCache
+    from Locator import Locators
+    from Screen import classify
+
+    parse, index, classify_samples = [], [], []
+    selectors = {loc.name: {"strategy": loc.strategy, "fast": [], "xpath": []} for loc in Locators.all()}
+    screens = {}
+    saved_stats = {loc.name: dict(loc.stats) for loc in Locators.all()}
+
+    try:
+        for name, xml in corpus.items():
+            parse += _timeit(lambda: UISnapshot(xml), repeat)
+            # 只计建索引：同一份快照解析一次，每次计时前清掉 cached_property 缓存的索引
+            parsed = UISnapshot(xml)
+            index += _timeit(parsed._build_index, repeat,
+                             setup=lambda: [parsed.__dict__.pop(k, None) for k in ("by_text", "by_resource_id")])
+            classify_samples += _timeit(lambda: classify(UISnapshot(xml)), repeat)
+
+            snap = UISnapshot(xml)
+            snap._build_index()
+            screens[name] = classify(snap).value
+            for loc in Locators.all():
+                compiled = SelectorCache.get(loc.xpath)
+                selectors[loc.name]["fast"] += _timeit(lambda: loc.match(snap), repeat)
+                selectors[loc.name]["xpath"] += _timeit(lambda: compiled(snap.root), repeat)
+    finally:
+        for loc in Locators.all():
+            loc.stats.clear()
+            loc.stats.update(saved_stats[loc.name])
+
+    # index 只含建索引；classify 包含解析、建索引和指纹匹配，对应启动循环中一次识别的真实开销
+    return {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "files": len(corpus),
+            "repeat": repeat,
+        },
+        "screens": screens,
+        "parse": _summary(parse),
+        "index": _summary(index),
+        "classify": _summary(classify_samples),
+        "selectors": {
+            name: {"strategy": v["strategy"], "fast": _summary(v["fast"]), "xpath": _summary(v["xpath"])}
+            for name, v in selectors.items()
+        },
+    }
+
+
+def _medians(result: dict) -> dict[str, float]:
+    """把结果展开为 指标名 -> 中位数（微秒）"""
+    flat = {k: result[k]["median_us"] for k in ("parse", "index", "classify")}
+    for name, v in result["selectors"].items():
+        flat[f"selectors.{name}.fast"] = v["fast"]["median_us"]
+        flat[f"selectors.{name}.xpath"] = v["xpath"]["median_us"]
+    return flat
+
+
+def compare(result: dict, baseline: dict, threshold: float) -> list[str]:
+    """对比基线，返回中位数超过 基线 × threshold 的指标"""
+    current, base = _medians(result), _medians(baseline)
+    regressions = []
+    for key, value in current.items():
+        old = base.get(key)
+        if old and value > old * threshold:
+            regressions.append(f"{key}: {old:.1f}us -> {value:.1f}us ({value / old:.2f}x)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="选择器匹配基准测试")
+    parser.add_argument("-d", "--dir", action="append", default=None,
+                        help="XML 语料目录，可重复指定（默认: xml/ 与 replay/eplus/）")
+    parser.add_argument("-n", "--repeat", type=int, default=50, help="每项重复次数（默认: 50）")
+    parser.add_argument("-o", "--output", default=None, help="JSON 输出路径（默认输出到标准输出）")
+    parser.add_argument("--baseline", default=None, help="基线 JSON，用于回退检测")
+    parser.add_argument("--threshold", type=float, default=1.3, help="回退判定倍数（默认: 1.3）")
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.dir or DEFAULT_CORPUS)
+    if not corpus:
+        print("[ERROR] 未找到任何 XML 层级文件，请先用 dump_ui_hierarchy.py 导出", file=sys.stderr)
+        sys.exit(1)
+
+    result = run_benchmark(corpus, args.repeat)
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+        print(f"[INFO] 结果已写入: {args.output}", file=sys.stderr)
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(result, baseline, args.threshold)
+        for line in regressions:
+            print(f"[REGRESSION] {line}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -26,6 +26,9 @@ DATA_FILES = [
     (os.path.join(PROJECT_DIR, "Setting.py"), "."),
     (os.path.join(PROJECT_DIR, "Log.py"), "."),
     (os.path.join(PROJECT_DIR, "deliSignup.py"), "."),
+    (os.path.join(PROJECT_DIR, "Screen.py"), "."),
+    (os.path.join(PROJECT_DIR, "Locator.py"), "."),
+    (os.path.join(PROJECT_DIR, "Flow.py"), "."),
 ]
 
 # PyInstaller 隐藏导入
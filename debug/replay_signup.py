@@ -0,0 +1,87 @@
+"""
+使用离线回放设备端到端运行签到流程
+不需要 MuMu 模拟器，可在 Linux 上对 Deli.run 做基准测试和性能分析
+
+用法:
+    python replay_signup.py                       # 默认场景，2 个用户
+    python replay_signup.py -u 20 --no-latency    # 20 个用户，去掉模拟延迟
+    python replay_signup.py --profile             # 输出 cProfile 热点
+"""
+
+import os
+import sys
+import time
+import argparse
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.abspath(os.path.join(SCRIPT_DIR, "..", "Deli_EPlus_AutoSignUp"))
+if not os.path.isdir(PROJECT_DIR):
+    PROJECT_DIR = os.path.dirname(SCRIPT_DIR)
+sys.path.insert(0, PROJECT_DIR)
+
+DEFAULT_SCENARIO = os.path.join(SCRIPT_DIR, "replay", "eplus")
+
+
+def run_replay(scenario_dir: str, user_count: int, latency: dict = None, punch: bool = True):
+    """用回放设备执行一次 Deli.run，返回 (是否成功, 耗时秒数, 回放设备)"""
+    from Setting import Setting
+    from deliSignup import Deli
+    from emulator.replay import ReplayMumu
+
+    users = {f"replay_user_{i}": "replay_pass" for i in range(user_count)}
+    emulator = ReplayMumu(scenario_dir, latency)
+
+    # Deli.run 会重新加载 config.json，这里在加载后替换为回放用户，不改动配置文件
+    original_reload = Setting.reload
+
+    def _reload():
+        original_reload()
+        Setting.users = users
+
+    Setting.reload = _reload
+    d = Deli()
+    d.debugmode = not punch
+    d.select_emulator = lambda: (lambda **kwargs: emulator)
+    try:
+        start = time.perf_counter()
+        ok = d.run()
+        elapsed = time.perf_counter() - start
+    finally:
+        Setting.reload = original_reload
+    return ok, elapsed, emulator.device
+
+
+def main():
+    parser = argparse.ArgumentParser(description="使用录制的 UI 层级离线回放签到流程")
+    parser.add_argument("-s", "--scenario", default=DEFAULT_SCENARIO, help="场景目录（含 scenario.json）")
+    parser.add_argument("-u", "--users", type=int, default=2, help="模拟用户数（默认: 2）")
+    parser.add_argument("--no-latency", action="store_true", help="去掉场景中配置的模拟延迟")
+    parser.add_argument("--debugmode", action="store_true", help="调试模式，不执行打卡")
+    parser.add_argument("--profile", action="store_true", help="使用 cProfile 输出耗时最多的函数")
+    args = parser.parse_args()
+
+    latency = None
+    if args.no_latency:
+        latency = {k: 0 for k in ("dump_hierarchy", "click", "send_keys", "press", "shell", "app_start",
+                                  "window_size", "app_current", "clear_text")}
+
+    if args.profile:
+        import cProfile
+        import pstats
+        profiler = cProfile.Profile()
+        profiler.enable()
+        ok, elapsed, device = run_replay(args.scenario, args.users, latency, punch=not args.debugmode)
+        profiler.disable()
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(25)
+    else:
+        ok, elapsed, device = run_replay(args.scenario, args.users, latency, punch=not args.debugmode)
+
+    print(f"\n{'=' * 60}")
+    print(f"结果: {'成功' if ok else '失败'} | 用户数: {args.users} | 耗时: {elapsed:.2f}s")
+    print(f"设备调用: {dict(device.calls)}")
+    print(f"{'=' * 60}")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -8,6 +8,7 @@ import sys
 import os
 import json
 import tempfile
+import itertools
 import logging
 
 # 设置模块路径
@@ -126,6 +127,20 @@ class TestSettingModule(unittest.TestCase):
         self.assertTrue(os.path.exists(CONFIG_PATH))
         self.assertIn("serial", cfg)
 
+    def test_instances(self):
+        """测试多实例配置：列表或逗号分隔字符串，数量必须一致"""
+        from Setting import Setting, reload_config
+        try:
+            Setting.serial, Setting.emulator_num = "127.0.0.1:16384", "0"
+            self.assertEqual(Setting.instances(), [("127.0.0.1:16384", "0")])
+            Setting.serial, Setting.emulator_num = "a:1, b:2", ["0", 1]
+            self.assertEqual(Setting.instances(), [("a:1", "0"), ("b:2", "1")])
+            Setting.emulator_num = "0"
+            with self.assertRaises(ValueError):
+                Setting.instances()
+        finally:
+            reload_config()
+
 
 # ==================== 测试 Log 模块 ====================
 class TestLogModule(unittest.TestCase):
@@ -246,6 +261,38 @@ class TestDeliClass(unittest.TestCase):
         with self.assertRaises(ValueError):
             d.select_emulator()
 
+    def test_select_emulator_backend_registry(self):
+        """测试按 backend 配置选择后端：单一后端、按 serial 混合分派、未知后端和缺少接口"""
+        from deliSignup import Deli
+        from Setting import Setting, reload_config
+        from emulator.backends import Backends
+        from emulator.adb import AdbEmulator
+        from emulator.replay import ReplayMumu
+        d = Deli()
+        try:
+            Setting.backend = "fake"
+            self.assertIs(d.select_emulator(), ReplayMumu)
+
+            Setting.serial, Setting.emulator_num = "emulator-5554,127.0.0.1:16384", "0,1"
+            Setting.backend = ["adb", "fake"]
+            factory = d.select_emulator()
+            self.assertIsInstance(factory(serial="emulator-5554", num="0"), AdbEmulator)
+            replay = factory(serial="127.0.0.1:16384", num="1")
+            self.assertIsInstance(replay, ReplayMumu)
+            self.assertTrue(os.path.isfile(os.path.join(replay.scenario_dir, "scenario.json")))
+
+            Setting.backend = "bluestacks"
+            with self.assertRaises(ValueError):
+                d.select_emulator()
+            with self.assertRaises(TypeError):
+                Backends.register("broken", object)
+            self.assertNotIn("broken", Backends.names())
+            partial = type("Partial", (), {m: lambda self: None for m in Backends.INTERFACE if m != "wait_change"})
+            with self.assertRaisesRegex(TypeError, "wait_change"):
+                Backends.register("partial", partial)
+        finally:
+            reload_config()
+
     def test_stop_flag(self):
         """测试 stop() 方法设置停止标志"""
         from deliSignup import Deli
@@ -306,6 +353,946 @@ class TestDeliClass(unittest.TestCase):
         self.assertEqual(len(sig.parameters), 0)
 
 
+# ==================== 测试 UI 快照（不连接模拟器） ====================
+SAMPLE_HIERARCHY = """<?xml version='1.0' encoding='UTF-8' standalone='yes' ?>
+<hierarchy rotation="0">
+  <node index="0" text="" resource-id="" class="android.widget.FrameLayout" package="com.delicloud.app.smartoffice" bounds="[0,0][720,1280]">
+    <node index="0" text="" resource-id="com.delicloud.app.smartoffice:id/et_phone" class="android.widget.EditText" package="com.delicloud.app.smartoffice" bounds="[40,300][680,380]" />
+    <node index="1" text="" resource-id="com.delicloud.app.smartoffice:id/et_password" class="android.widget.EditText" package="com.delicloud.app.smartoffice" password="true" bounds="[40,400][680,480]" />
+    <node index="2" text="登录" resource-id="" class="android.widget.TextView" package="com.delicloud.app.smartoffice" bounds="[40,520][680,600]" />
+  </node>
+</hierarchy>
+"""
+
+
+def _stub_mumu(hierarchy: str = SAMPLE_HIERARCHY, **attrs):
+    """不连接设备的 Mumu：device 为 MagicMock，dump_hierarchy 返回 hierarchy，attrs 覆盖其余属性"""
+    from unittest.mock import MagicMock
+    from emulator.mumu import Mumu
+    mumu = Mumu.__new__(Mumu)
+    mumu._last_snapshot = None
+    mumu.log = MagicMock()
+    mumu.device = MagicMock()
+    mumu.device.dump_hierarchy = MagicMock(return_value=hierarchy)
+    for name, value in attrs.items():
+        setattr(mumu, name, value)
+    return mumu
+
+
+class TestUISnapshot(unittest.TestCase):
+    """emulator/mumu.py UISnapshot 和 SelectorCache 测试"""
+
+    def test_class_name_as_tag(self):
+        """测试 node 标签被替换为 class 名，兼容 uiautomator2 xpath 写法"""
+        from emulator.mumu import UISnapshot
+        snap = UISnapshot(SAMPLE_HIERARCHY)
+        self.assertTrue(snap.exists("//android.widget.TextView[@text='登录']"))
+        self.assertFalse(snap.exists("//android.widget.TextView[@text='我的']"))
+
+    def test_first_match_order(self):
+        """测试 first_match 按顺序返回第一个存在的选择器"""
+        from emulator.mumu import UISnapshot
+        snap = UISnapshot(SAMPLE_HIERARCHY)
+        login = "//android.widget.TextView[@text='登录']"
+        self.assertEqual(snap.first_match([
+            "//android.widget.TextView[@text='跳过']",
+            login,
+        ]), login)
+        self.assertIsNone(snap.first_match(["//android.widget.TextView[@text='跳过']"]))
+
+    def test_center(self):
+        """测试节点中心坐标计算"""
+        from emulator.mumu import UISnapshot
+        snap = UISnapshot(SAMPLE_HIERARCHY)
+        node = snap.find("//android.widget.TextView[@text='登录']")
+        self.assertEqual(UISnapshot.center(node), (360, 560))
+
+    def test_selector_cache_hits(self):
+        """测试同一选择器只编译一次，后续查询命中缓存"""
+        from emulator.mumu import UISnapshot, SelectorCache
+        SelectorCache.clear()
+        for _ in range(3):
+            UISnapshot(SAMPLE_HIERARCHY).exists("//android.widget.TextView[@text='登录']")
+        stats = SelectorCache.stats()
+        self.assertEqual(stats["misses"], 1)
+        self.assertEqual(stats["hits"], 2)
+        self.assertEqual(stats["size"], 1)
+
+
+class TestMumuWait(unittest.TestCase):
+    """Mumu 基于快照的等待、点击和坐标缓存测试（设备为 MagicMock）"""
+
+    def test_snapshot_reused_when_unchanged(self):
+        """测试层级摘要不变时复用快照，变化时重新解析"""
+        mumu = _stub_mumu()
+        first = mumu.snapshot()
+        self.assertIs(mumu.snapshot(), first)
+
+        mumu.device.dump_hierarchy.return_value = SAMPLE_HIERARCHY.replace('text="登录"', 'text="我的"')
+        changed = mumu.wait_change(timeout=1, interval=0)
+        self.assertIsNotNone(changed)
+        self.assertIsNot(changed, first)
+        self.assertTrue(changed.exists("//android.widget.TextView[@text='我的']"))
+
+    def test_wait_for_polls_without_events(self):
+        """测试事件流不可用时退化为轮询，直到元素出现"""
+        from unittest.mock import MagicMock
+        mumu = _stub_mumu()
+        other = SAMPLE_HIERARCHY.replace('text="登录"', 'text="跳过"')
+        mumu.device.dump_hierarchy = MagicMock(side_effect=[other, other, SAMPLE_HIERARCHY])
+        node = mumu.wait_for("//android.widget.TextView[@text='登录']", timeout=2, poll_interval=0.01)
+        self.assertIsNotNone(node)
+        self.assertEqual(mumu.device.dump_hierarchy.call_count, 3)
+
+    def test_click_cached_reuses_and_invalidates(self):
+        """测试坐标缓存：命中时按坐标点击，确认失败时清除缓存"""
+        from unittest.mock import MagicMock
+        mumu = _stub_mumu(_tap_cache={}, _resolution=None)
+        mumu.device.window_size = MagicMock(return_value=(720, 1280))
+        login = "//android.widget.TextView[@text='登录']"
+        phone = "//android.widget.EditText[@resource-id='com.delicloud.app.smartoffice:id/et_phone']"
+
+        # 首次：查找后点击并记录坐标
+        self.assertTrue(mumu.click_cached(login, "login", confirm=phone))
+        self.assertEqual(mumu._tap_cache[("login", login, (720, 1280))], (360, 560))
+
+        # 再次：直接按坐标点击，确认元素存在
+        mumu.device.click.reset_mock()
+        self.assertTrue(mumu.click_cached(login, "login", confirm=phone))
+        mumu.device.click.assert_called_once_with(360, 560)
+
+        # 确认失败：清除缓存并回退为查找后点击
+        self.assertTrue(mumu.click_cached(login, "login", confirm="//android.widget.TextView[@text='我的']",
+                                          confirm_timeout=0.01))
+        mumu.log.warning.assert_called()
+        self.assertIn(("login", login, (720, 1280)), mumu._tap_cache)
+
+    def test_wait_returns_resolved_handle(self):
+        """测试 wait 返回已解析句柄，链式 click/exists 不再查询设备"""
+        mumu = _stub_mumu()
+
+        element = mumu.wait("//android.widget.TextView[@text='登录']")
+        self.assertTrue(element.exists())
+        self.assertEqual(element.bounds, (40, 520, 680, 600))
+        element.click()
+        mumu.device.click.assert_called_once_with(360, 560)
+        self.assertEqual(mumu.device.dump_hierarchy.call_count, 1)
+
+        missing = mumu.wait("//android.widget.TextView[@text='我的']", timeout=0)
+        self.assertFalse(missing.exists())
+        missing.click()
+        mumu.device.click.assert_called_once()
+
+    def test_wait_any_first_match(self):
+        """测试 wait_any 在同一快照中按顺序返回首个命中的选择器"""
+        mumu = _stub_mumu()
+        login = "//android.widget.TextView[@text='登录']"
+        phone = "//android.widget.EditText[@resource-id='com.delicloud.app.smartoffice:id/et_phone']"
+
+        matched, element = mumu.wait_any(["//android.widget.TextView[@text='跳过']", login, phone])
+        self.assertEqual(matched, login)
+        self.assertEqual(element.center, (360, 560))
+        self.assertEqual(mumu.device.dump_hierarchy.call_count, 1)
+
+        matched, element = mumu.wait_any(["//android.widget.TextView[@text='跳过']"], timeout=0)
+        self.assertIsNone(matched)
+        self.assertIsNone(element)
+
+
+class TestDevicePool(unittest.TestCase):
+    """DevicePool 连接池测试"""
+
+    def test_device_pool_reuse_and_evict(self):
+        """测试连接池复用健康连接，失效连接被淘汰后重连"""
+        from unittest.mock import MagicMock
+        from emulator.mumu import DevicePool
+        DevicePool.clear()
+        first, second = MagicMock(), MagicMock()
+        connect = MagicMock(side_effect=[first, second])
+        try:
+            first.jsonrpc_call.return_value = {"sdkInt": 32}
+            self.assertIs(DevicePool.get("127.0.0.1:16384", connect), first)
+            first.jsonrpc_call.assert_not_called()  # 新建连接已就绪，不再检查
+            self.assertIs(DevicePool.get("127.0.0.1:16384", connect), first)
+            self.assertEqual(connect.call_count, 1)
+            first.jsonrpc_call.assert_called_once_with("deviceInfo", timeout=DevicePool.HEALTH_TIMEOUT)
+
+            first.jsonrpc_call.side_effect = ConnectionError("uiautomator quit")
+            self.assertIs(DevicePool.get("127.0.0.1:16384", connect), second)
+            self.assertEqual(DevicePool.stats(), {"hits": 1, "misses": 2, "evictions": 1, "size": 1})
+        finally:
+            DevicePool.clear()
+
+    def test_device_pool_concurrent_stats(self):
+        """测试多个签到线程同时取用连接：命中计数不丢失"""
+        import threading
+        from unittest.mock import MagicMock
+        from emulator.mumu import DevicePool
+        DevicePool.clear()
+        device = MagicMock()
+        try:
+            DevicePool.get("127.0.0.1:16384", MagicMock(return_value=device))
+            threads = [threading.Thread(target=lambda: [DevicePool.get("127.0.0.1:16384") for _ in range(200)])
+                       for _ in range(8)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            self.assertEqual(DevicePool.stats(), {"hits": 1600, "misses": 1, "evictions": 0, "size": 1})
+        finally:
+            DevicePool.clear()
+
+
+class TestEmulatorPool(unittest.TestCase):
+    """emulator/pool.py 保温池测试"""
+
+    def test_emulator_pool_warm_and_recycle(self):
+        """测试保温池：只开机未运行的实例，连续多次不健康才回收，使用中的实例跳过检查"""
+        import time
+        from unittest.mock import MagicMock
+        from emulator.pool import EmulatorPool
+        members = {}
+
+        def factory(serial=None, num=None):
+            members[num] = MagicMock()
+            members[num].manager_exe = os.path.join("nonexistent", "MuMuManager.exe")  # 批量查询失败，回退到 ADB 探测
+            members[num].is_running.return_value = num == "0"
+            return members[num]
+
+        try:
+            EmulatorPool.start(factory, [("a:1", "0"), ("b:2", "1"), ("c:3", "2")], size=2, interval=3600)
+            self.assertEqual(set(members), {"0", "1"})
+            # 预热在后台线程中进行，start 不阻塞调用方
+            deadline = time.time() + 2
+            while not members["1"]._spawn_emulator.called and time.time() < deadline:
+                time.sleep(0.01)
+            members["0"]._spawn_emulator.assert_not_called()
+            members["1"]._spawn_emulator.assert_called_once()
+
+            members["0"].health.return_value = False
+            members["1"].health.return_value = True
+            EmulatorPool.acquire("1")
+            self.assertEqual(EmulatorPool.check(max_failures=2), {"0": False})
+            members["0"].recycle.assert_not_called()
+            EmulatorPool.release("1")
+            self.assertEqual(EmulatorPool.check(max_failures=2), {"0": False, "1": True})
+            members["0"].recycle.assert_called_once()
+            members["1"].health.assert_called_once()
+            self.assertEqual(EmulatorPool.stats()["recycles"], 1)
+
+            # 检查期间实例被签到占用：本轮结果作废，不回收
+            members["0"].health.side_effect = lambda: EmulatorPool.acquire("0") or False
+            self.assertNotIn("0", EmulatorPool.check(max_failures=1))
+            members["0"].recycle.assert_called_once()
+            EmulatorPool.release("0")
+        finally:
+            EmulatorPool.stop()
+            EmulatorPool.recycles = 0
+            EmulatorPool.checks = 0
+
+
+class TestMuMuManager(unittest.TestCase):
+    """MuMuManager 批量查询测试"""
+
+    def test_mumu_manager_bulk_info(self):
+        """测试 MuMuManager 批量查询：解析单实例和多实例输出，TTL 内复用缓存"""
+        from unittest.mock import MagicMock, patch
+        from emulator.mumu import MuMuManager
+        output = json.dumps({
+            "0": {"index": "0", "name": "MuMu", "is_android_started": True, "is_process_started": True,
+                  "adb_host_ip": "127.0.0.1", "adb_port": 16384, "pid": 4321},
+            "1": {"index": "1", "name": "MuMu-1", "is_android_started": False, "is_process_started": False},
+        })
+        single = MuMuManager.parse(json.dumps({"index": "2", "is_android_started": False}))
+        self.assertEqual(list(single), ["2"])
+
+        MuMuManager.invalidate()
+        run = MagicMock(return_value=MagicMock(stdout=output))
+        try:
+            with patch("emulator.mumu.subprocess.run", run):
+                infos = MuMuManager.instances("MuMuManager.exe")
+                self.assertEqual(infos["0"].serial, "127.0.0.1:16384")
+                self.assertEqual(infos["0"].pid, 4321)
+                self.assertFalse(infos["1"].running)
+                self.assertIsNone(infos["1"].adb_port)
+                self.assertIs(MuMuManager.get("MuMuManager.exe", 1), infos["1"])
+                self.assertEqual(run.call_count, 1)
+                MuMuManager.instances("MuMuManager.exe", refresh=True)
+                self.assertEqual(run.call_count, 2)
+        finally:
+            MuMuManager.invalidate()
+
+
+class TestMumuLifecycle(unittest.TestCase):
+    """Mumu 连接、流水线启动、启动应用和虚拟位置测试"""
+
+    def test_connect_stages_backoff(self):
+        """测试分阶段连接：未就绪时退避重试并记录各阶段耗时，非预期异常直接抛出"""
+        from unittest.mock import MagicMock, patch
+        mumu = _stub_mumu(serial="127.0.0.1:16384")
+        device = MagicMock()
+        mumu._probe_tcp = MagicMock(side_effect=[ConnectionRefusedError(), ConnectionRefusedError(), True])
+        mumu._probe_adb = MagicMock(return_value=True)
+        mumu._probe_agent = MagicMock(side_effect=[None, device])
+        with patch("emulator.mumu.sleep") as fake_sleep, patch("emulator.mumu.random.uniform", return_value=1.0):
+            mumu.connect(timeout=5)
+        self.assertIs(mumu.device, device)
+        self.assertEqual(mumu.connect_timings["tcp"][1], 3)
+        self.assertEqual(mumu.connect_timings["agent"][1], 2)
+        delays = [c.args[0] for c in fake_sleep.call_args_list]
+        self.assertEqual(delays[:2], [0.2, 0.4])  # 指数退避
+
+        mumu._probe_tcp = MagicMock(side_effect=ValueError("bad serial"))
+        with self.assertRaises(ValueError):
+            mumu.connect(timeout=5)
+        mumu._probe_tcp = MagicMock(return_value=False)
+        with self.assertRaises(TimeoutError):
+            mumu.connect(timeout=0)
+
+    def test_boot_overlaps_agent_and_launch(self):
+        """测试流水线启动：uiautomator 预热期间即拉起应用且只拉起一次，准备函数的异常在最后抛出"""
+        import threading
+        from unittest.mock import MagicMock, patch
+        from emulator.mumu import Mumu
+        mumu = _stub_mumu(serial="127.0.0.1:16384", use_shell_channel=False)
+        launched = threading.Event()
+        device = MagicMock()
+        device.app_current.return_value = {"package": "com.test.app"}
+        mumu._spawn_emulator = MagicMock()
+        mumu._probe_tcp = mumu._probe_adb = MagicMock(return_value=True)
+        mumu._probe_package = MagicMock(return_value=True)
+        mumu._launch = MagicMock(side_effect=lambda pkg: launched.set())
+        mumu._probe_agent = MagicMock(side_effect=lambda: device if launched.wait(2) else None)
+
+        # 上次运行设置的虚拟位置不再可信（实例可能已被外部重启），启动时清除
+        with patch.dict(Mumu._locations, {"127.0.0.1:16384": (39.9, 116.4)}):
+            timings = mumu.boot("com.test.app", prepare=MagicMock(), timeout=5)
+            self.assertNotIn("127.0.0.1:16384", Mumu._locations)
+        self.assertIs(mumu.device, device)
+        self.assertLessEqual(timings["launch"], timings["agent"])
+        self.assertIn("prepare", timings)
+        self.assertIn("app", timings)
+        mumu._launch.assert_called_once()
+        device.app_start.assert_not_called()  # 已在前台，不再经 uiautomator2 重复启动
+
+        # 拉起后未进入前台：才经 start_app 重新启动
+        mumu.LAUNCH_CONFIRM = 0.2
+        device.app_current.side_effect = [{"package": "com.android.launcher"}] * 3 + [{"package": "com.test.app"}]
+        mumu.boot("com.test.app", timeout=5)
+        device.app_start.assert_called_once_with("com.test.app", stop=False)
+
+        with self.assertRaises(ValueError):
+            launched.clear()
+            mumu.boot("com.test.app", prepare=MagicMock(side_effect=ValueError("没有配置任何用户")), timeout=5)
+
+    def test_start_app_confirms_foreground(self):
+        """测试 start_app 按前台包名确认启动，轮询间隔逐步增大"""
+        from unittest.mock import patch
+        mumu = _stub_mumu()
+        mumu.device.app_current.side_effect = [
+            {"package": "com.android.launcher"}, {"package": "com.android.launcher"}, {"package": "com.test.app"},
+        ]
+        with patch("emulator.mumu.sleep") as fake_sleep:
+            mumu.start_app("com.test.app", timeout=5)
+        mumu.device.app_start.assert_called_once_with("com.test.app", stop=False)
+        self.assertEqual([c.args[0] for c in fake_sleep.call_args_list], [0.1, 0.2])
+
+    def test_start_app_through_shell_channel(self):
+        """测试常驻 shell 会话可用时启动和前台确认都经会话执行，不再走 uiautomator2"""
+        from unittest.mock import MagicMock
+        mumu = _stub_mumu(shell_channel=MagicMock())
+        focus = "  mCurrentFocus=Window{1a2b3c u0 com.test.app/com.test.app.MainActivity}\n"
+        mumu.shell_channel.run.side_effect = [("", 0), ("Events injected: 1\n", 0), (focus, 0)]
+        mumu.start_app("com.test.app", timeout=5, stop=True)
+        commands = [c.args[0][:2] for c in mumu.shell_channel.run.call_args_list]
+        self.assertEqual(commands, [["am", "force-stop"], ["monkey", "-p"], ["dumpsys", "window"]])
+        mumu.device.app_start.assert_not_called()
+        mumu.device.app_current.assert_not_called()
+
+    def test_launch_and_foreground_activity(self):
+        """测试经 shell 解析启动 Activity（按包名缓存）和前台 Activity，相对类名补全包名"""
+        from unittest.mock import MagicMock, patch
+        from emulator.mumu import Mumu
+        mumu = _stub_mumu(shell_channel=MagicMock())
+        mumu.shell_channel.run.side_effect = [
+            ("priority=0 preferredOrder=0\ncom.test.app/.SplashActivity\n", 0),
+            ("  mCurrentFocus=Window{1a2b u0 com.test.app/com.test.app.SplashActivity}\n", 0),
+        ]
+        with patch.dict(Mumu._launch_activities, clear=True):
+            self.assertEqual(mumu.launch_activity("com.test.app"), "com.test.app.SplashActivity")
+            self.assertEqual(mumu.launch_activity("com.test.app"), "com.test.app.SplashActivity")
+            self.assertEqual(mumu.foreground_activity(), "com.test.app.SplashActivity")
+        self.assertEqual(mumu.shell_channel.run.call_count, 2)
+
+    def test_location_cache_per_instance(self):
+        """测试虚拟位置缓存：相同位置不重复调用 MuMuManager，位置变化或实例重新开机后重新设置"""
+        from unittest.mock import MagicMock, patch
+        from emulator.mumu import Mumu
+        mumu = _stub_mumu(serial="127.0.0.1:16608", num="7", manager_exe="MuMuManager.exe",
+                          emulator_exe="MuMuNxMain.exe")
+        run = MagicMock(return_value=MagicMock(stdout='{"errcode": 0}', stderr=""))
+        try:
+            with patch("emulator.mumu.subprocess.run", run), patch("emulator.mumu.Thread"):
+                mumu.set_vitual_location(39.9, 116.4)
+                mumu.set_vitual_location(39.9, 116.4)
+                self.assertEqual(run.call_count, 1)
+                mumu.set_vitual_location(31.2, 121.5)
+                self.assertEqual(run.call_count, 2)
+                mumu._spawn_emulator()
+                mumu.set_vitual_location(31.2, 121.5)
+                self.assertEqual(run.call_count, 3)
+                mumu.set_vitual_location(31.2, 121.5, force=True)
+                self.assertEqual(run.call_count, 4)
+        finally:
+            Mumu._locations.clear()
+
+
+class TestShellChannel(unittest.TestCase):
+    """ShellChannel 常驻 shell 会话测试"""
+
+    def test_shell_channel_reuse_and_reconnect(self):
+        """测试常驻 shell 会话按哨兵行切分输出，多条命令共用一个会话，断开后自动重连"""
+        import re
+        from unittest.mock import MagicMock
+        from emulator.mumu import ShellChannel
+
+        class FakeShell:
+            """模拟 sh：每写入一批命令，回显 input 命令的参数并输出哨兵行"""
+            def __init__(self, broken=False):
+                self.conn = MagicMock()
+                self.out = b""
+                self.broken = broken
+
+            def send(self, data):
+                cmd, echo = data.decode().splitlines()
+                self.out += cmd.replace(" < /dev/null", "").encode() + b"\n"
+                self.out += re.sub(r"^echo (\S+):\$\?$", r"\1:0", echo).encode() + b"\n"
+
+            def recv(self, n):
+                if self.broken:
+                    return b""
+                chunk, self.out = self.out[:n], self.out[n:]
+                return chunk
+
+            def close(self):
+                pass
+
+        class StaleShell(FakeShell):
+            """已断开的会话：发送即失败"""
+            def send(self, data):
+                raise ConnectionResetError("stale")
+
+        adb_device = MagicMock()
+        adb_device.shell.side_effect = [StaleShell(), FakeShell()]
+        channel = ShellChannel(adb_device, MagicMock())
+        self.assertEqual(channel.run(["input", "keyevent", "KEYCODE_DEL"]), ("input keyevent KEYCODE_DEL\n", 0))
+        self.assertEqual(channel.run("getprop sys.boot_completed")[1], 0)
+        self.assertEqual(channel.opened, 2)
+        self.assertEqual(adb_device.shell.call_count, 2)
+
+        # 命令已发送后读取失败（超时或断开）：命令可能已执行，只关闭会话，不重发
+        adb_device.shell.side_effect = [FakeShell(broken=True)]
+        channel = ShellChannel(adb_device, MagicMock())
+        with self.assertRaises(EOFError):
+            channel.run(["input", "keyevent", "KEYCODE_DEL"])
+        self.assertEqual(channel.opened, 1)
+        self.assertIsNone(channel._conn)
+
+        # 经 Mumu.shell：发送后断开不改用单次 adb shell 重发，会话保留，下一条命令重新建立
+        mumu = _stub_mumu(shell_channel=ShellChannel(adb_device, MagicMock()))
+        adb_device.shell.side_effect = [FakeShell(broken=True), FakeShell()]
+        with self.assertRaises(EOFError):
+            mumu.shell(["input", "keyevent", "KEYCODE_BACK"])
+        mumu.device.shell.assert_not_called()
+        self.assertEqual(mumu.shell(["input", "keyevent", "KEYCODE_BACK"]), "input keyevent KEYCODE_BACK\n")
+        self.assertEqual(mumu.shell_channel.opened, 2)
+
+        # 发送失败：命令一定没有执行，本条改为单次执行，会话仍保留
+        adb_device.shell.side_effect = [StaleShell(), StaleShell(), FakeShell()]
+        mumu.shell_channel.close()
+        mumu.device.shell.return_value.output = "1\n"
+        self.assertEqual(mumu.shell(["getprop", "sys.boot_completed"]), "1\n")
+        mumu.device.shell.assert_called_once()
+        self.assertIsNotNone(mumu.shell_channel)
+        self.assertEqual(mumu.shell(["getprop", "sys.boot_completed"]), "getprop sys.boot_completed\n")
+
+
+class TestMetrics(unittest.TestCase):
+    """Metrics 设备操作耗时统计测试"""
+
+    def test_metrics_per_operation_and_selector(self):
+        """测试设备操作耗时按操作和选择器分组记录，异常调用计入失败次数"""
+        from emulator.mumu import Metrics
+        from Locator import Locators
+        Metrics.reset()
+        mumu = _stub_mumu()
+
+        mumu.wait(Locators.LOGIN).click()
+        mumu.wait(Locators.SKIP, timeout=0)
+        self.assertEqual(Metrics.get("wait")["count"], 2)
+        self.assertEqual(Metrics.get("wait", "login")["count"], 1)
+        self.assertEqual(Metrics.get("click", "login")["count"], 1)
+        self.assertEqual(Metrics.get("dump_hierarchy")["count"], 2)
+        self.assertLessEqual(Metrics.percentile("wait", 0.9), Metrics.get("wait")["max"])
+
+        mumu.device.dump_hierarchy.side_effect = RuntimeError("offline")
+        with self.assertRaises(RuntimeError):
+            mumu.wait(Locators.LOGIN)
+        self.assertEqual(Metrics.get("wait", "login")["errors"], 1)
+        self.assertTrue(any(line.startswith("wait[login]") for line in Metrics.report()))
+        Metrics.reset()
+
+
+class TestScreenClassifier(unittest.TestCase):
+    """Screen.py 页面识别测试"""
+
+    def test_classify_login(self):
+        """测试登录表单识别"""
+        from emulator.mumu import UISnapshot
+        from Screen import classify, ScreenState
+        self.assertIs(classify(UISnapshot(SAMPLE_HIERARCHY)), ScreenState.LOGIN)
+
+    def test_classify_popup_before_page(self):
+        """测试弹窗状态优先于页面状态"""
+        from emulator.mumu import UISnapshot
+        from Screen import classify, ScreenState
+        xml = SAMPLE_HIERARCHY.replace('text="登录"', 'text="确定"')
+        self.assertIs(classify(UISnapshot(xml)), ScreenState.LOGIN_INVALID)
+        xml = SAMPLE_HIERARCHY.replace('text="登录"', 'text="打卡成功"')
+        self.assertIs(classify(UISnapshot(xml)), ScreenState.RESULT)
+
+    def test_fingerprints_follow_locators(self):
+        """测试指纹的文本和 resource-id 取自 Locators，而不是另写一份"""
+        from unittest.mock import patch
+        from Locator import Locators
+        from Screen import FINGERPRINTS, ScreenState, _fingerprint
+        fingerprints = dict(FINGERPRINTS)
+        self.assertIn(Locators.SKIP.value, fingerprints[ScreenState.SPLASH]["texts"])
+        self.assertIn(Locators.PHONE.value, fingerprints[ScreenState.LOGIN]["resource_ids"])
+        self.assertEqual(fingerprints[ScreenState.LOGIN_INVALID]["excludes"],
+                         [Locators.LOGOUT.value, Locators.SETTINGS.value])
+        with patch.object(Locators.LOGIN, "value", "登 录"):
+            self.assertEqual(_fingerprint([Locators.LOGIN])["texts"], ["登 录"])
+
+    def test_classify_unknown(self):
+        """测试无法识别的页面"""
+        from emulator.mumu import UISnapshot
+        from Screen import classify, ScreenState
+        xml = '<hierarchy rotation="0"><node class="android.widget.FrameLayout" text="" bounds="[0,0][1,1]" /></hierarchy>'
+        self.assertIs(classify(UISnapshot(xml)), ScreenState.UNKNOWN)
+
+    def test_screenshot_detector_learns_from_hierarchy(self):
+        """测试截图识别器经层级识别确认两次后学到参考，之后不再 dump 层级"""
+        from unittest.mock import MagicMock
+        from PIL import Image, ImageDraw
+        from emulator.mumu import UISnapshot
+        from Screen import ScreenDetector, ScreenState, detect_state
+
+        login_image = Image.new("RGB", (180, 320), "white")
+        ImageDraw.Draw(login_image).rectangle((10, 130, 170, 150), fill="black")
+        other_image = Image.new("RGB", (180, 320), "white")
+        ImageDraw.Draw(other_image).rectangle((60, 10, 120, 300), fill="black")
+
+        emulator = MagicMock()
+        emulator.screenshot_small.return_value = login_image
+        emulator.snapshot.return_value = UISnapshot(SAMPLE_HIERARCHY)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "screen_hashes.json")
+            detector = ScreenDetector(path)
+            for _ in range(3):
+                self.assertIs(detect_state(emulator, detector), ScreenState.LOGIN)
+            self.assertEqual(emulator.snapshot.call_count, 2)
+
+            reloaded = ScreenDetector(path)
+            self.assertEqual(reloaded.detect(login_image, ["login"]), "login")
+            self.assertIsNone(reloaded.detect(other_image, ["login"]))
+            self.assertIsNone(reloaded.detect(login_image, ["login", "splash"], require_all=True))
+
+    def test_detector_save_atomic(self):
+        """测试多个识别器并发写同一参考文件：结果是完整的 JSON 且包含每个识别器学到的参考，不残留临时文件"""
+        import threading
+        from Screen import ScreenDetector
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "screen_hashes.json")
+            detectors = []
+            for i in range(4):
+                detector = ScreenDetector(path)
+                detector.references = {f"label{i}": [(None, i * 1000 + j) for j in range(200)]}
+                detectors.append(detector)
+            threads = [threading.Thread(target=lambda d=d: [d.save() for _ in range(20)]) for d in detectors]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            self.assertEqual(os.listdir(tmp), ["screen_hashes.json"])
+            references = ScreenDetector(path).references
+            self.assertEqual(sorted(references), [f"label{i}" for i in range(4)])
+            self.assertTrue(all(len(refs) == 200 for refs in references.values()))
+
+
+class TestLocatorRegistry(unittest.TestCase):
+    """Locator.py 元素注册表测试"""
+
+    def test_strategy_planning(self):
+        """测试根据 xpath 自动选择匹配方式"""
+        from Locator import Locator, Locators
+        self.assertEqual(Locators.PHONE.strategy, "resource-id")
+        self.assertEqual(Locators.LOGIN.strategy, "class+text")
+        self.assertEqual(Locator("any", "//*[@text='登录']").strategy, "text")
+        self.assertEqual(Locator("complex", "//android.widget.TextView[contains(@text,'登')]").strategy, "xpath")
+
+    def test_fast_path_matches_xpath(self):
+        """测试索引查找结果与通用 xpath 一致"""
+        from emulator.mumu import UISnapshot
+        from Locator import Locators
+        snap = UISnapshot(SAMPLE_HIERARCHY)
+        for loc in Locators.all():
+            nodes = snap.root.xpath(loc.xpath)
+            expected = nodes[0] if nodes else None
+            self.assertIs(snap.find(loc), expected, loc.name)
+
+    def test_wait_records_latency(self):
+        """测试 wait 记录选择器等待耗时"""
+        from Locator import Locator
+        mumu = _stub_mumu()
+        loc = Locator("login", "//android.widget.TextView[@text='登录']")
+        self.assertTrue(mumu.wait(loc).exists())
+        self.assertEqual(loc.stats["wait_count"], 1)
+        self.assertEqual(loc.stats["wait_miss"], 0)
+
+    def test_stats_thread_safe(self):
+        """测试多个签到线程同时匹配和等待时选择器统计与编译缓存计数不丢失"""
+        import threading
+        from emulator.mumu import UISnapshot, SelectorCache
+        from Locator import Locator
+        loc = Locator("login", "//android.widget.TextView[@text='登录']")
+        snap = UISnapshot(SAMPLE_HIERARCHY)
+        SelectorCache.clear()
+
+        def worker():
+            for _ in range(500):
+                loc.match(snap)
+                loc.record_wait(0.01, True)
+                SelectorCache.get("//android.widget.TextView[@text='我的']")
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(loc.stats["match_count"], 4000)
+        self.assertEqual(loc.stats["wait_count"], 4000)
+        stats = SelectorCache.stats()
+        self.assertEqual(stats["hits"] + stats["misses"], 4000)
+
+
+# ==================== 测试离线回放设备 ====================
+REPLAY_SCENARIO = os.path.join(SCRIPT_DIR, "replay", "eplus")
+NO_LATENCY = {k: 0 for k in ("dump_hierarchy", "click", "send_keys", "press", "shell", "app_start",
+                             "window_size", "app_current", "clear_text")}
+
+
+class TestReplayDevice(unittest.TestCase):
+    """emulator/replay.py 回放设备测试（不连接模拟器）"""
+
+    def test_click_transitions(self):
+        """测试点击文本后按场景切换页面"""
+        from emulator.replay import ReplayDevice
+        device = ReplayDevice.load(REPLAY_SCENARIO, NO_LATENCY)
+        self.assertEqual(device.current, "splash")
+        self.assertTrue(device.xpath("//android.widget.TextView[@text='跳过']").exists)
+        device.xpath("//android.widget.TextView[@text='跳过']").click()
+        self.assertEqual(device.current, "login")
+        self.assertEqual(device.calls["click"], 1)
+
+    def test_send_keys_to_focused_field(self):
+        """测试输入框获得焦点后输入文本，del 删除末尾字符"""
+        from emulator.replay import ReplayDevice
+        device = ReplayDevice.load(REPLAY_SCENARIO, NO_LATENCY)
+        device.app_start("com.delicloud.app.smartoffice")
+        device.current = "login"
+        device.click(360, 340)
+        device.send_keys("13800000000", clear=True)
+        device.press("del")
+        self.assertIn('text="1380000000"', device.dump_hierarchy())
+
+    def test_input_text_batched_and_confirmed(self):
+        """测试输入文本只用一次 shell 批量清空，并从元素属性确认结果"""
+        from Locator import Locators
+        from emulator.replay import ReplayMumu
+        emulator = ReplayMumu(REPLAY_SCENARIO, NO_LATENCY)
+        emulator.connect()
+        emulator.device.current = "login"
+        phone = emulator.wait(Locators.PHONE)
+        phone.click()
+        self.assertTrue(phone.send_keys("13800000000"))
+        self.assertEqual(emulator.device.calls["shell"], 1)
+        self.assertEqual(emulator.device.calls["press"], 0)
+
+        emulator.device.send_keys = lambda text, clear=False: None  # 模拟输入法未生效
+        self.assertFalse(phone.send_keys("13900000000"))
+
+        # 未标记 password 的自绘密码框显示掩码（最后一位可能短暂明文），按长度确认
+        emulator.wait(Locators.PASSWORD).click()
+        emulator.device._focused.attrib.update({"password": "false", "text": "•••4"})
+        self.assertTrue(emulator._confirm_text(Locators.PASSWORD, "1234"))
+        self.assertFalse(emulator._confirm_text(Locators.PASSWORD, "12345"))
+
+        # 密码框不暴露文本时无法确认，视为成功；有文本但长度不符才算失败
+        emulator.device._focused.attrib.update({"password": "true", "text": ""})
+        self.assertTrue(emulator._confirm_text(Locators.PASSWORD, "1234"))
+        emulator.device._focused.attrib["text"] = "•••"
+        self.assertFalse(emulator._confirm_text(Locators.PASSWORD, "1234"))
+
+    def test_enter_credentials_retry_then_raise(self):
+        """测试输入账号确认失败时重新聚焦重试一次，仍失败时抛出异常而不是继续点击登录"""
+        from unittest.mock import MagicMock
+        from Flow import _enter_phone
+        deli = MagicMock()
+        field = deli.emulator.wait.return_value
+        field.send_keys.side_effect = [False, True]
+        _enter_phone(deli, {"username": "13800000000"})
+        self.assertEqual(field.click.call_count, 2)
+
+        field.send_keys.side_effect = [False, False]
+        with self.assertRaises(RuntimeError):
+            _enter_phone(deli, {"username": "13800000000"})
+
+    def test_reach_login_from_any_screen(self):
+        """测试启动流程从考勤页、结果弹窗、设置页等任意页面都能回到登录页，无法回到时超时报错"""
+        from unittest.mock import patch
+        from deliSignup import Deli
+        from emulator.replay import ReplayMumu
+        emulator = ReplayMumu(REPLAY_SCENARIO, NO_LATENCY)
+        emulator.connect()
+        d = Deli()
+        d.emulator = emulator
+        with patch("Flow.BACK_AFTER", 0):
+            for screen in ["attendance_out", "attendance_done", "result", "settings", "agreement", "home", "splash"]:
+                emulator.device.current = screen
+                d.reach_login()
+                self.assertEqual(emulator.device.current, "login", screen)
+                self.assertLess(emulator.device.calls["dump_hierarchy"], 200, screen)
+
+        emulator.device.back = {}  # 返回键无效，始终停留在未识别页面
+        emulator.device.current = "settings"
+        clock = itertools.count(0, 7)
+        with patch("Flow.sleep"), patch.object(emulator, "wait_change", return_value=None):
+            with patch("Flow.time", side_effect=lambda: next(clock)):
+                with self.assertRaises(TimeoutError):
+                    d.reach_login()
+
+    def test_static_logo_not_backed_out(self):
+        """测试启动后 Logo 页长时间不变：不在启动页按返回键（会退出应用），应用退到桌面时重新拉起"""
+        from unittest.mock import patch
+        from lxml import etree
+        from deliSignup import Deli
+        from emulator.replay import ReplayMumu
+        emulator = ReplayMumu(REPLAY_SCENARIO, NO_LATENCY)
+        emulator.connect()
+        device = emulator.device
+        device.screens["logo"] = etree.fromstring(
+            '<hierarchy rotation="0"><node class="android.widget.FrameLayout" package="com.delicloud.app.smartoffice"'
+            ' text="" resource-id="" bounds="[0,0][720,1280]"><node class="android.widget.ImageView" text=""'
+            ' resource-id="com.delicloud.app.smartoffice:id/iv_logo" bounds="[260,500][460,700]" /></node></hierarchy>')
+        device.launch = "logo"
+        emulator.start_app("com.delicloud.app.smartoffice", stop=True)
+        d = Deli()
+        d.emulator = emulator
+        rounds = []
+
+        def loading(timeout=None, interval=None):
+            # Logo 页保持不变 5 轮后进入启动广告
+            rounds.append(device.current)
+            if len(rounds) == 5:
+                device.current = "splash"
+                return emulator.snapshot()
+            return None
+
+        with patch("Flow.BACK_AFTER", 0), patch("Flow.sleep"), patch.object(emulator, "wait_change", loading), \
+                patch.object(emulator, "press_keys", wraps=emulator.press_keys) as press_keys:
+            d.reach_login()
+            self.assertEqual(device.current, "login")
+            press_keys.assert_not_called()
+
+            # 应用已退到桌面：重新拉起，而不是继续按返回键
+            device.exited = True
+            rounds.clear()
+            d.reach_login()
+            self.assertEqual(device.current, "login")
+            self.assertFalse(device.exited)
+            press_keys.assert_not_called()
+
+    def test_recover_cold_starts_app(self):
+        """测试失败恢复：不带 stop 的 app_start 停留在原页面，恢复时结束应用冷启动后回到登录页"""
+        from deliSignup import Deli
+        from emulator.replay import ReplayMumu
+        emulator = ReplayMumu(REPLAY_SCENARIO, NO_LATENCY)
+        emulator.connect()
+        emulator.start_app("com.delicloud.app.smartoffice")
+        emulator.device.current = "attendance_out"
+        emulator.start_app("com.delicloud.app.smartoffice")
+        self.assertEqual(emulator.device.current, "attendance_out")
+
+        d = Deli()
+        d.emulator = emulator
+        clicks = emulator.device.calls["click"]
+        d.recover(timeout=5)
+        self.assertEqual(emulator.device.current, "login")
+        self.assertEqual(emulator.device.calls["click"] - clicks, 1)  # 只点击了启动页的“跳过”
+
+    def test_deli_run_end_to_end(self):
+        """测试 Deli.run 使用回放设备完整跑通签到流程"""
+        from Setting import Setting
+        from deliSignup import Deli
+        from emulator.replay import ReplayMumu
+        emulator = ReplayMumu(REPLAY_SCENARIO, NO_LATENCY)
+        original_reload = Setting.reload
+
+        def _reload():
+            original_reload()
+            Setting.users = {"user1": "pass1", "user2": "pass2"}
+
+        Setting.reload = _reload
+        try:
+            d = Deli()
+            d.debugmode = False
+            d.select_emulator = lambda: (lambda **kwargs: emulator)
+            started = []
+            d.on_user = lambda idx, username: started.append((idx, username))
+            self.assertTrue(d.run())
+        finally:
+            Setting.reload = original_reload
+        self.assertEqual(emulator.device.current, "login")
+        self.assertEqual(started, [(0, "user1"), (1, "user2")])
+        self.assertEqual(d.results, {"user1": True, "user2": True})
+
+    def test_deli_run_parallel_instances(self):
+        """测试多实例并行签到：用户分配到各实例，失败实例的用户被其他实例窃取"""
+        from Setting import Setting
+        from deliSignup import Deli
+        from emulator.replay import ReplayMumu
+        users = {f"user{i}": "pass" for i in range(5)}
+        created = {}
+
+        def factory(serial=None, num=None):
+            if num == "2":
+                raise ConnectionError("实例未启动")
+            created[num] = ReplayMumu(REPLAY_SCENARIO, NO_LATENCY, serial=serial, num=num)
+            return created[num]
+
+        original_reload = Setting.reload
+
+        def _reload():
+            original_reload()
+            Setting.users = users
+            Setting.serial = ["127.0.0.1:16384", "127.0.0.1:16416", "127.0.0.1:16448"]
+            Setting.emulator_num = ["0", "1", "2"]
+
+        Setting.reload = _reload
+        try:
+            d = Deli()
+            d.debugmode = False
+            d.select_emulator = lambda: factory
+            self.assertTrue(d.run())
+        finally:
+            Setting.reload = original_reload
+            Setting.reload()
+        self.assertEqual(d.results, {user: True for user in users})
+        self.assertEqual(set(created), {"0", "1"})
+        self.assertEqual(created["0"].serial, "127.0.0.1:16384")
+
+    def test_work_stealing_queue(self):
+        """测试工作窃取队列：先取自己的任务，空了从最长的队列尾部窃取"""
+        from deliSignup import WorkStealingQueue
+        queue = WorkStealingQueue(list(range(6)), workers=2)
+        self.assertEqual(queue.take(0), 0)
+        self.assertEqual([queue.take(0), queue.take(0)], [2, 4])
+        self.assertEqual(queue.take(0), 5)
+        self.assertEqual(queue.steals, 1)
+        self.assertEqual(queue.remaining(), [1, 3])
+
+    def test_selector_benchmark(self):
+        """测试选择器基准在回放语料上输出完整结果，并能检测回退"""
+        sys.path.insert(0, SCRIPT_DIR)
+        from bench_selectors import load_corpus, run_benchmark, compare
+        from Locator import Locators
+        corpus = load_corpus([REPLAY_SCENARIO])
+        stats = {loc.name: dict(loc.stats) for loc in Locators.all()}
+        result = run_benchmark(corpus, repeat=1)
+        self.assertEqual({loc.name: loc.stats for loc in Locators.all()}, stats)  # 基准不污染选择器统计
+        self.assertEqual(result["meta"]["files"], len(corpus))
+        self.assertEqual(set(result["selectors"]), {loc.name for loc in Locators.all()})
+        self.assertIn("splash", result["screens"].values())
+        self.assertEqual(compare(result, result, 1.3), [])
+
+        slower = json.loads(json.dumps(result))
+        slower["parse"]["median_us"] = result["parse"]["median_us"] / 2
+        self.assertEqual(len(compare(result, slower, 1.3)), 1)
+
+
+# ==================== 测试签到流程状态机 ====================
+class TestFlowEngine(unittest.TestCase):
+    """Flow.py 声明式流程和执行引擎测试"""
+
+    def _deli(self, debugmode=False):
+        from unittest.mock import MagicMock
+        deli = MagicMock()
+        deli.debugmode = debugmode
+        return deli
+
+    def test_transitions_and_optional_step(self):
+        """测试按动作返回值转移、可选步骤跳过以及 on_step 进度回调"""
+        from Flow import Flow, Step, FlowEngine, SKIPPED
+        outcomes = iter(["retry", "retry", "ok"])
+        flow = Flow("test", "check", [
+            Step("check", "检查 {username}", lambda d, c: next(outcomes), next="check", transitions={"ok": "punch"}),
+            Step("punch", "打卡", lambda d, c: None, next="done", when=lambda d: not d.debugmode,
+                 transitions={SKIPPED: "done"}),
+            Step("done", "完成", lambda d, c: None),
+        ])
+        engine = FlowEngine(self._deli())
+        labels = []
+        engine.on_step = lambda step, ctx: labels.append(step.label.format(**ctx))
+        self.assertEqual(engine.run(flow, {"username": "u1"}), ["check", "check", "check", "punch", "done"])
+        self.assertEqual(labels[0], "检查 u1")
+
+        outcomes = iter(["ok"])
+        engine = FlowEngine(self._deli(debugmode=True))
+        self.assertEqual(engine.run(flow, {"username": "u1"}), ["check", "punch", "done"])
+
+    def test_timeout_and_stop(self):
+        """测试循环状态超时、停止请求以及转移到未定义状态的流程在定义时报错"""
+        from unittest.mock import patch
+        from Flow import Flow, Step, FlowEngine
+        flow = Flow("loop", "wait", [
+            Step("wait", "等待", lambda d, c: None, next="wait", timeout=5, timeout_message="等待超时"),
+        ])
+        clock = iter([0, 3, 6])
+        engine = FlowEngine(self._deli())
+        with patch("Flow.time", lambda: next(clock)):
+            with self.assertRaises(TimeoutError):
+                engine.run(flow, {})
+
+        deli = self._deli()
+        deli._check_stop.side_effect = InterruptedError
+        with self.assertRaises(InterruptedError):
+            FlowEngine(deli).run(flow, {})
+        with self.assertRaises(ValueError):
+            Flow("broken", "a", [Step("a", "a", lambda d, c: None, next="missing")])
+
+    def test_signin_flow_definition(self):
+        """测试签到流程：调试模式跳过打卡直接退出，正常模式经打卡、等待结果、关闭弹窗后退出"""
+        from Flow import SIGNIN, STARTUP, SKIPPED
+        from Locator import Locators
+        self.assertEqual(SIGNIN.steps["range"].transitions[Locators.IN_RANGE], "punch")
+        self.assertEqual(SIGNIN.steps["punch"].transitions[SKIPPED], "logout")
+        self.assertEqual(SIGNIN.steps["result"].next, "close")
+        self.assertEqual(SIGNIN.steps["close"].next, "logout")
+        self.assertEqual(max(s.progress for s in SIGNIN.steps.values()), 8)
+        self.assertIn("detect", STARTUP.steps)
+
+
 # ==================== 测试 GUI 组件（无头） ====================
 class TestWin11Components(unittest.TestCase):
     """Win11 风格组件单元测试"""
@@ -1032,6 +2019,37 @@ class TestDeliSignupAppCore(unittest.TestCase):
         })
         reload_config()
 
+    def test_instance_check_off_tk_thread(self):
+        """测试实例核对在后台线程执行：输入时不阻塞，结果回到 Tk 线程后并入验证结果"""
+        import threading
+        import time
+        from unittest.mock import patch
+        self.app._show_page("settings")
+        with tempfile.TemporaryDirectory() as emu_dir:
+            for fname in ["MuMuManager.exe", "MuMuNxMain.exe", "adb.exe"]:
+                open(os.path.join(emu_dir, fname), "w").close()
+            self.app.emulator_path_entry.set(emu_dir)
+            self.app.serial_entry.set("127.0.0.1:16384")
+            self.app.emulator_num_entry.set("5")
+            self.app.lat_entry.set("39")
+            self.app.lng_entry.set("116")
+            threads = []
+
+            def check(*args):
+                threads.append(threading.current_thread())
+                return ["模拟器编号不存在: 5"]
+
+            with patch("gui.DeliSignupApp._check_instances", side_effect=check):
+                self.assertEqual(self.app._validate_settings(show=False), [])  # 结果尚未返回，不阻塞
+                deadline = time.time() + 5
+                while self.app._instance_check[1] == [] and time.time() < deadline:
+                    self.app.root.update()
+                    time.sleep(0.05)
+            self.assertEqual(len(threads), 1)
+            self.assertIsNot(threads[0], threading.main_thread())
+            self.assertIn("模拟器编号不存在", self.app.settings_error_label.cget("text"))
+            self.assertIn("模拟器编号不存在: 5", self.app._validate_settings(show=False))
+
     def test_settings_error_label_display(self):
         """测试设置页错误提示标签"""
         from Setting import save_config, reload_config
@@ -1132,8 +2150,9 @@ class TestDeliSignupAppCore(unittest.TestCase):
             mumu.log = MagicMock()
             mumu.device = MagicMock()
 
-            # 场景1：app_start 直接成功
+            # 场景1：app_start 直接成功，前台应用即为目标包名
             mumu.device.app_start = MagicMock()
+            mumu.device.app_current = MagicMock(return_value={"package": "com.test.app"})
             mumu.start_app("com.test.app", timeout=5)
             mumu.device.app_start.assert_called_once()
             mumu.log.info.assert_any_call = True
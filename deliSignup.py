@@ -1,13 +1,57 @@
-from emulator.mumu import Mumu
+from emulator.mumu import SelectorCache, DevicePool, Metrics
+from emulator.backends import Backends
+from emulator.pool import EmulatorPool
 from Setting import Setting
 from Log import Log
-from time import time, sleep
+from Screen import ScreenDetector
+from Locator import Locators
+from Flow import FlowEngine, STARTUP, SIGNIN
 import threading
+from collections import deque
+
+
+class WorkStealingQueue:
+    """多实例任务调度：每个 worker 一个双端队列，先取自己队列头部，取空后从最长的其他队列尾部窃取
+
+    某个实例启动失败或变慢时，它名下剩余的用户自然会被其他实例取走
+    """
+
+    def __init__(self, items: list, workers: int):
+        self._queues = [deque() for _ in range(workers)]
+        for i, item in enumerate(items):
+            self._queues[i % workers].append(item)
+        self._lock = threading.Lock()
+        self.steals = 0
+
+    def take(self, worker: int):
+        """取下一个任务，全部取完返回 None"""
+        with self._lock:
+            own = self._queues[worker]
+            if own:
+                return own.popleft()
+            victim = max(self._queues, key=len)
+            if not victim:
+                return None
+            self.steals += 1
+            return victim.pop()
+
+    def remaining(self) -> list:
+        """尚未被取走的任务"""
+        with self._lock:
+            return [item for q in self._queues for item in q]
 
 
 class Deli:
     """得力 E+ 自动签到主类，支持在子线程中运行"""
 
+    # 退出登录导航：(点击前页面, 点击元素, 点击后应出现的元素)
+    LOGOUT_STEPS = [
+        ("home", Locators.MINE, Locators.SETTINGS),
+        ("mine", Locators.SETTINGS, Locators.LOGOUT),
+        ("settings", Locators.LOGOUT, Locators.CONFIRM),
+        ("logout_confirm", Locators.CONFIRM, Locators.LOGIN),
+    ]
+
     def __init__(self) -> None:
         self.log = Log("deli").logger
         self.debugmode = True
@@ -16,10 +60,19 @@ class Deli:
         self._running = False
         self._stop_flag = False
         self.emulator = None
+        self.detector = None  # 截图识别器，配置 screen_detector 开启时创建
+        self.results = {}  # 用户 -> 签到结果（True 或失败原因）
+        self._workers = []  # 多实例运行时每个实例的 Deli
+        self.next_user = None  # 下一个签到的用户，当前用户退出登录时在后台预设其虚拟位置
+        self._pending_location = None  # 预设位置的后台线程
+        self.engine = FlowEngine(self)  # 启动和签到流程见 Flow.py，GUI 通过 engine.on_step 获取进度
+        self.on_user = None  # 单实例运行时每个用户开始签到前调用 on_user(序号, 用户名)，GUI 据此切换进度阶段
 
     def stop(self):
         """请求停止签到流程"""
         self._stop_flag = True
+        for worker in self._workers:
+            worker._stop_flag = True
         self.log.info("收到停止请求")
 
     def _check_stop(self):
@@ -29,75 +82,155 @@ class Deli:
             raise InterruptedError("签到已由用户中断")
 
     def select_emulator(self):
+        """按配置项 backend 返回模拟器工厂 factory(serial=..., num=...)，各实例后端不同时按 serial 分派"""
+        names = Setting.backends()
+        if len(set(names)) == 1:
+            return self._backend(names[0])
+        by_serial = {serial: self._backend(name) for (serial, _), name in zip(Setting.instances(), names)}
+        return lambda serial=None, num=None: by_serial[serial](serial=serial, num=num)
+
+    def _backend(self, name: str):
+        if name != "auto":
+            return Backends.get(name)
         if "MuMu" in Setting.emulator_path:
-            return Mumu
+            return Backends.get("mumu")
         else:
             self.log.error("未检测到 MuMu 模拟器路径，请在设置中配置")
             raise ValueError("未配置 MuMu 模拟器路径")
 
+    def prepare(self):
+        """启动模拟器期间在后台执行：校验配置、预编译全部选择器、加载截图识别参考"""
+        if not Setting.users:
+            raise ValueError("没有配置任何用户，请在设置中添加账号")
+        for username in [None, *Setting.users]:
+            self.location_for(username)  # 经纬度必须是数字
+        for loc in Locators.all():
+            SelectorCache.get(loc.xpath)
+        self.detector = ScreenDetector(ScreenDetector.DEFAULT_PATH) if Setting.screen_detector else None
+
     def check_login_invaild(self):
-        if not self.check_login_invaild_done and self.emulator.wait(
-            "//android.widget.TextView[@text='确定']", timeout=0.1
-        ).exists():
-            self.emulator.wait("//android.widget.TextView[@text='确定']", timeout=0.1).click()
+        if self.check_login_invaild_done:
+            return
+        confirm = self.emulator.wait(Locators.CONFIRM, timeout=0.1)
+        if confirm.exists():
+            confirm.click()
             self.check_login_invaild_done = True
 
+    def logout(self, check_invalid=False):
+        """退出当前账号（我的 → 设置 → 退出登录 → 确定），导航元素按缓存坐标直接点击"""
+        for state, xpath, confirm in self.LOGOUT_STEPS:
+            if check_invalid and state != "logout_confirm":
+                self.check_login_invaild()
+            self.emulator.click_cached(xpath, state, confirm)
+
     def login(self, username, password):
-        self._check_stop()
+        """按 SIGNIN 流程为一个用户签到，结束时已退出登录回到登录表单"""
+        self.engine.run(SIGNIN, {"username": username, "password": password})
 
-        self.emulator.wait(
-            "//android.widget.EditText[@resource-id='com.delicloud.app.smartoffice:id/et_phone']"
-        ).click()
-        self.emulator.wait(
-            "//android.widget.EditText[@resource-id='com.delicloud.app.smartoffice:id/et_phone']"
-        ).send_keys(username)
-        self.emulator.wait("//android.widget.EditText[@resource-id='com.delicloud.app.smartoffice:id/et_password']").click()
-        self.emulator.wait("//android.widget.EditText[@resource-id='com.delicloud.app.smartoffice:id/et_password']").send_keys(password)
-        self.emulator.wait("//android.widget.TextView[@text='登录']").click()
-        self.emulator.set_vitual_location()
-        self.emulator.wait("//android.widget.TextView[@text='同意并继续']").click()
-        self.emulator.wait("//android.widget.TextView[@text='智能考勤']").click()
-        
-        start_time = time()
-        flag_success = False
-        while True:
-            self._check_stop()
-            if time() - start_time > 90:
-                self.log.error("签到超时，请检查模拟器定位经纬度")
-                raise TimeoutError("签到超时")
-            if self.emulator.wait(
-                "//android.widget.TextView[@text='已在打卡范围内']", timeout=0.3
-            ).exists():
-                if not self.debugmode:
-                    self.emulator.wait(
-                        "//android.widget.TextView[@text='打卡']", timeout=0.3
-                    ).click()
-                    while not flag_success:
-                        self._check_stop()
-                        for i in ['打卡成功', '签到成功', '签退成功', '迟到', '早退']:
-                            if self.emulator.wait(
-                                "//android.widget.TextView[@text='" + i + "']", timeout=0.1
-                            ).exists():
-                                self.emulator.wait(
-                                    "//android.widget.ImageView[@resource-id='com.delicloud.app.smartoffice:id/iv_close']",
-                                    timeout=0.3,
-                                ).click()
-                                flag_success = True
-                            self.log.info(f"签到结果: {i}")
-                            break
-                break
-            elif self.emulator.wait(
-                "//android.widget.TextView[@text='不在打卡范围内']", timeout=0.3
-            ).exists():
-                self.emulator.wait(
-                    "//android.widget.TextView[@text='刷新']", timeout=0.1
-                ).click()
+    def location_for(self, username: str | None) -> tuple[float, float]:
+        """用户的虚拟位置：user_locations 中单独配置的优先，否则使用全局 location"""
+        location = (Setting.user_locations or {}).get(username) or Setting.location
+        return float(location.get("latitude", 111)), float(location.get("longitude", 111))
+
+    def apply_location(self, username: str):
+        """设置用户的虚拟位置；后台预设仍在进行时先等待，位置已生效时 set_vitual_location 直接跳过"""
+        pending, self._pending_location = self._pending_location, None
+        if pending is not None:
+            pending.join()
+        self.emulator.set_vitual_location(*self.location_for(username))
+
+    def prefetch_location(self, username: str | None):
+        """在后台为下一个用户预设虚拟位置，与退出登录并行；失败时由 apply_location 重新设置"""
+        if username is None:
+            return
+
+        def apply():
+            try:
+                self.emulator.set_vitual_location(*self.location_for(username))
+            except Exception as e:
+                self.log.warning(f"预设虚拟位置失败: {username} - {str(e)}")
+
+        self._pending_location = threading.Thread(target=apply, name="prefetch-location", daemon=True)
+        self._pending_location.start()
+
+    def reach_login(self):
+        """处理启动后的各种页面（广告、登录失效、已登录主页），直到出现登录表单"""
+        self.engine.run(STARTUP, {})
 
+    def recover(self, timeout: float = 60):
+        """签到失败后恢复到登录页：结束并冷启动应用（否则只会回到失败时的页面）
+
+        启动应用限时 timeout 秒，处理启动页面由 STARTUP 流程的超时兜底，恢复不会无限阻塞
+        """
+        self.emulator.start_app(self.deli_package_name, timeout=timeout, stop=True)
+        self.reach_login()
+
+    def run_parallel(self, factory, instances: list[tuple[str, str]]) -> bool:
+        """每个模拟器实例一个 worker 线程，按工作窃取分配用户，结果汇总到 self.results"""
+        queue = WorkStealingQueue(list(Setting.users.items()), len(instances))
+        self._workers = []
+        threads = []
+        for index, (serial, num) in enumerate(instances):
+            worker = Deli()
+            worker.debugmode = self.debugmode
+            worker.log = Log(f"deli-{num}").logger
+            worker._stop_flag = self._stop_flag
+            self._workers.append(worker)
+            threads.append(threading.Thread(target=worker._work, args=(factory, serial, num, index, queue, self.results),
+                                            name=f"deli-{num}", daemon=True))
+        self.log.info(f"使用 {len(instances)} 个模拟器实例并行签到 {len(Setting.users)} 个用户")
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
         self._check_stop()
-        self.emulator.wait("//android.widget.TextView[@text='我的']").click()
-        self.emulator.wait("//android.widget.TextView[@text='设置']").click()
-        self.emulator.wait("//android.widget.TextView[@text='退出登录']").click()
-        self.emulator.wait("//android.widget.TextView[@text='确定']").click()
+
+        for user, _ in queue.remaining():
+            self.results[user] = "没有可用的模拟器实例"
+        failed = {user: result for user, result in self.results.items() if result is not True}
+        for user, reason in failed.items():
+            self.log.error(f"签到失败: {user} - {reason}")
+        self.log.info(f"并行签到完成: 成功 {len(self.results) - len(failed)}，失败 {len(failed)}，窃取 {queue.steals} 次")
+        return not failed
+
+    def _work(self, factory, serial: str, num: str, index: int, queue: WorkStealingQueue, results: dict):
+        """单个实例的 worker：启动模拟器后循环取用户签到，实例不可用时退出，剩余用户由其他实例窃取"""
+        EmulatorPool.acquire(num)
+        try:
+            self._sign_users(factory, serial, num, index, queue, results)
+        finally:
+            EmulatorPool.release(num)
+
+    def _sign_users(self, factory, serial: str, num: str, index: int, queue: WorkStealingQueue, results: dict):
+        try:
+            self.emulator = factory(serial=serial, num=num)
+            self.emulator.boot(self.deli_package_name, prepare=self.prepare)
+            self.reach_login()
+        except InterruptedError:
+            return
+        except Exception as e:
+            self.log.error(f"实例 {serial} 启动失败: {str(e)}")
+            return
+        while not self._stop_flag:
+            item = queue.take(index)
+            if item is None:
+                return
+            username, password = item
+            self.log.info(f"正在签到: {username}（实例 {serial}）")
+            try:
+                self.login(username, password)
+                results[username] = True
+            except InterruptedError:
+                results[username] = "已中断"
+                return
+            except Exception as e:
+                results[username] = str(e) or type(e).__name__
+                self.log.error(f"签到失败: {username} - {results[username]}，重新启动应用")
+                try:
+                    self.recover()
+                except Exception as e:
+                    self.log.error(f"实例 {serial} 恢复失败，停止取任务: {str(e)}")
+                    return
 
     def run(self) -> bool:
         """
@@ -105,53 +238,50 @@ class Deli:
         """
         self._running = True
         self._stop_flag = False
+        instances = []
         try:
             # 重新加载配置
             Setting.reload()
+            Metrics.reset()  # 耗时统计按单次运行输出
 
+            self.results = {}
             try:
-                self.emulator = self.select_emulator()()
+                factory = self.select_emulator()
+                instances = Setting.instances()
             except (TypeError, ValueError) as e:
                 self.log.error(f"初始化模拟器失败: {str(e)}")
                 return False
 
-            self._check_stop()
-            self.emulator.start_emulator()
-            self.emulator.start_app(self.deli_package_name)
-
-            while True:
-                self._check_stop()
-                if self.emulator.wait(
-                    "//android.widget.TextView[@text='跳过']", timeout=0.5
-                ).exists():
-                    self.emulator.wait(
-                        "//android.widget.TextView[@text='跳过']", timeout=0.5
-                    ).click()
-                    self.check_login_invaild()
-                if self.emulator.wait(
-                    "//android.widget.TextView[@text='我的']", timeout=0.3
-                ).exists():
-                    self.check_login_invaild()
-                    self.emulator.wait("//android.widget.TextView[@text='我的']").click()
-                    self.check_login_invaild()
-                    self.emulator.wait("//android.widget.TextView[@text='设置']").click()
-                    self.check_login_invaild()
-                    self.emulator.wait("//android.widget.TextView[@text='退出登录']").click()
-                    self.emulator.wait("//android.widget.TextView[@text='确定']").click()
-                if self.emulator.wait(
-                    "//android.widget.TextView[@text='登录']", timeout=0.3
-                ).exists():
-                    break
-
             users = Setting.users
             if not users:
                 self.log.warning("没有配置任何用户，请在设置中添加账号")
                 return False
+            if len(instances) > 1:
+                return self.run_parallel(factory, instances)
+
+            EmulatorPool.acquire(instances[0][1])  # 签到期间保温池不检查、不回收该实例
+            self.emulator = factory(serial=instances[0][0], num=instances[0][1])
+            self._check_stop()
+            # 配置校验和选择器编译在模拟器开机期间完成
+            self.emulator.boot(self.deli_package_name, prepare=self.prepare)
+            self.reach_login()
 
-            for user in users.items():
+            items = list(users.items())
+            for i, user in enumerate(items):
                 self._check_stop()
                 self.log.info(f"正在签到: {user[0]}")
-                self.login(user[0], user[1])
+                if self.on_user is not None:
+                    self.on_user(i, user[0])
+                self.next_user = items[i + 1][0] if i + 1 < len(items) else None
+                try:
+                    self.login(user[0], user[1])
+                except InterruptedError:
+                    self.results[user[0]] = "已中断"
+                    raise
+                except Exception as e:
+                    self.results[user[0]] = str(e) or type(e).__name__
+                    raise
+                self.results[user[0]] = True
 
             self.log.info("所有用户签到完成")
             return True
@@ -163,6 +293,15 @@ class Deli:
             self.log.error(f"签到流程异常: {str(e)}")
             return False
         finally:
+            for _, num in instances:
+                EmulatorPool.release(num)
+            # 成功或失败都输出统计和设备操作耗时，便于定位慢在 dump、点击、按键、启动还是 MuMuManager
+            self.log.info(f"选择器缓存统计: {SelectorCache.stats()}")
+            self.log.info(f"设备连接池统计: {DevicePool.stats()}")
+            for name, avg, worst, count in Locators.slowest():
+                self.log.info(f"选择器耗时: {name} 平均 {avg:.3f}s 最长 {worst:.3f}s 共 {count} 次")
+            for line in Metrics.report():
+                self.log.info(f"设备操作耗时: {line}")
             self._running = False
 
 
@@ -0,0 +1,48 @@
+"""
+通用 ADB 后端：连接任意已开机的 Android 设备或模拟器（真机、雷电、夜神、AVD 等）
+- 不负责开关机，boot 只等待设备上线后拉起应用
+- 选择器、快照、输入等逻辑与 Mumu 完全一致，只替换依赖 MuMuManager 的部分
+"""
+
+import subprocess
+
+import adbutils
+
+from emulator.mumu import Mumu, DevicePool
+
+
+class AdbEmulator(Mumu):
+    """通过 adb 直连的设备，serial 为 adb devices 中的序列号或 host:port"""
+
+    def _spawn_emulator(self):
+        Mumu._locations.pop(self.serial, None)
+        self.log.info(f"通用 ADB 后端不负责开机，等待设备 {self.serial} 上线")
+
+    def instance_info(self):
+        return None  # 没有 MuMuManager 可查询
+
+    def recycle(self):
+        """回收设备：断开连接后通过 adb reboot 重启"""
+        self.log.warning(f"重启设备 {self.serial}")
+        Mumu._locations.pop(self.serial, None)
+        DevicePool.evict(self.serial)
+        if self.shell_channel is not None:
+            self.shell_channel.close()
+            self.shell_channel = None
+        adbutils.adb.device(self.serial).reboot()
+
+    def _apply_location(self, latitude: float, longitude: float):
+        """AVD（emulator-xxxx）通过 adb emu geo fix 设置位置，其他设备需要在设备上自行设置定位"""
+        if not str(self.serial).startswith("emulator-"):
+            self.log.warning(f"设备 {self.serial} 不支持通过 ADB 设置虚拟位置，请在设备上设置定位")
+            return
+        command = [adbutils.adb_path(), "-s", self.serial, "emu", "geo", "fix", str(longitude), str(latitude)]
+        try:
+            result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, timeout=15)
+        except subprocess.TimeoutExpired:
+            raise RuntimeError("设置虚拟位置超时")
+        if result.returncode != 0 or "KO" in result.stdout:
+            err_msg = (result.stderr or result.stdout).strip() or f"返回码 {result.returncode}"
+            self.log.error(f"设置虚拟位置失败: {err_msg}")
+            raise RuntimeError(f"设置虚拟位置失败: {err_msg}")
+        self.log.info(f"设置位置成功: 纬度 {latitude}, 经度 {longitude}")
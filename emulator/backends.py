@@ -0,0 +1,52 @@
+"""
+模拟器后端注册表：按配置项 backend 选择设备实现
+- mumu: MuMu 模拟器（MuMuNxMain 开机、MuMuManager 定位）
+- adb:  任意已开机的 adb 设备
+- fake: 进程内回放设备，不需要模拟器，用于在 Linux 上做基准和压力测试
+"""
+
+from emulator.mumu import Mumu
+from emulator.adb import AdbEmulator
+from emulator.replay import ReplayMumu
+
+
+class Backends:
+    """后端名 -> 设备类，设备类以 cls(serial=..., num=...) 创建实例"""
+
+    # 签到流程依赖的接口，新增调用时同步补充
+    INTERFACE = (
+        # deliSignup.py：开机、连接、启动应用、定位、导航点击
+        "boot", "connect", "start_app", "set_vitual_location", "click_cached",
+        # Flow.py / Screen.py：等待元素、输入、按键、层级和截图识别、前台页面判断
+        "wait", "wait_any", "wait_change", "input_text", "press_keys", "snapshot", "screenshot_small",
+        "_foreground_package", "foreground_activity", "launch_activity",
+        # pool.py：保温池的开机检查、健康检查和回收
+        "is_running", "_spawn_emulator", "health", "recycle",
+    )
+
+    _registry: dict[str, type] = {}
+
+    @classmethod
+    def register(cls, name: str, backend: type):
+        """注册后端，缺少接口方法时抛出 TypeError"""
+        missing = [m for m in cls.INTERFACE if not callable(getattr(backend, m, None))]
+        if missing:
+            raise TypeError(f"后端 {name} 缺少接口: {', '.join(missing)}")
+        cls._registry[name] = backend
+
+    @classmethod
+    def get(cls, name: str) -> type:
+        """按名称返回后端，未注册时抛出 ValueError"""
+        try:
+            return cls._registry[name]
+        except KeyError:
+            raise ValueError(f"未知的模拟器后端: {name}（可选: {', '.join(cls.names())}）") from None
+
+    @classmethod
+    def names(cls) -> list[str]:
+        return list(cls._registry)
+
+
+Backends.register("mumu", Mumu)
+Backends.register("adb", AdbEmulator)
+Backends.register("fake", ReplayMumu)
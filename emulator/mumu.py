@@ -1,132 +1,1029 @@
 from tkinter import N
+import re
+import random
+import socket
+import base64
+import hashlib
+import io
+import shlex
+import json
+from typing import NamedTuple
+from functools import cached_property, wraps
 import uiautomator2 as u2
-from uiautomator2.exceptions import ConnectError, AdbShellError, LaunchUiAutomationError,XPathElementNotFoundError
+from uiautomator2 import Device
+from uiautomator2.exceptions import ConnectError, AdbShellError, LaunchUiAutomationError
+from uiautomator2.xpath import safe_xmlstr
+import adbutils
 from adbutils.errors import AdbError
+from lxml import etree
+from PIL import Image
 from Setting import Setting
 from Log import Log
-from time import time, sleep
+from Locator import Locator
+from time import time, sleep, perf_counter
 import subprocess
-from threading import Thread
-def only_chained_calls(func):
-    def wrapper(self, *args, **kwargs):
-        if self.temp_element is not None:
-            result = func(self, *args, **kwargs)
-            self.temp_element = None
-            return result
-        else:
-            raise Exception("被处理的元素不存在")
+from threading import Thread, Lock
+from uuid import uuid4
+
+
+class Metrics:
+    """设备操作耗时统计：按 操作 和 (操作, 选择器) 记录调用次数、失败次数和耗时直方图，整个进程内累计"""
+
+    BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, float("inf"))  # 直方图上界（秒）
+    _data: dict[tuple[str, str | None], dict] = {}
+    _lock = Lock()
+
+    @classmethod
+    def record(cls, op: str, seconds: float, selector: str | None = None, error: bool = False):
+        """记录一次调用；有选择器时同时计入操作总计和该选择器的分组"""
+        with cls._lock:
+            for key in ((op, None), (op, selector)) if selector is not None else ((op, None),):
+                st = cls._data.get(key)
+                if st is None:
+                    st = cls._data[key] = {"count": 0, "errors": 0, "total": 0.0, "max": 0.0,
+                                           "buckets": [0] * len(cls.BUCKETS)}
+                st["count"] += 1
+                st["errors"] += int(error)
+                st["total"] += seconds
+                st["max"] = max(st["max"], seconds)
+                st["buckets"][next(i for i, le in enumerate(cls.BUCKETS) if seconds <= le)] += 1
+
+    @classmethod
+    def get(cls, op: str, selector: str | None = None) -> dict | None:
+        """返回某个操作（或操作下某个选择器）的统计副本，没有记录返回 None"""
+        with cls._lock:
+            st = cls._data.get((op, selector))
+            return None if st is None else {**st, "buckets": list(st["buckets"])}
+
+    @classmethod
+    def percentile(cls, op: str, q: float, selector: str | None = None) -> float | None:
+        """按直方图估算分位数，返回所在桶的上界（秒）"""
+        st = cls.get(op, selector)
+        if not st:
+            return None
+        target = q * st["count"]
+        seen = 0
+        for le, n in zip(cls.BUCKETS, st["buckets"]):
+            seen += n
+            if seen >= target:
+                return min(le, st["max"])
+        return st["max"]
+
+    @classmethod
+    def report(cls) -> list[str]:
+        """按总耗时降序生成可读的统计行"""
+        with cls._lock:
+            keys = sorted(cls._data, key=lambda k: cls._data[k]["total"], reverse=True)
+        lines = []
+        for op, selector in keys:
+            st = cls.get(op, selector)
+            name = op if selector is None else f"{op}[{selector}]"
+            lines.append(f"{name}: {st['count']} 次, 失败 {st['errors']}, 总计 {st['total']:.3f}s, "
+                         f"平均 {st['total'] / st['count']:.3f}s, p90≤{cls.percentile(op, 0.9, selector):.3f}s, "
+                         f"最长 {st['max']:.3f}s")
+        return lines
+
+    @classmethod
+    def reset(cls):
+        with cls._lock:
+            cls._data.clear()
+
+
+def instrumented(op: str, selector=None):
+    """记录被装饰方法的耗时到 Metrics；selector(self, *args, **kwargs) 返回本次调用的选择器"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(self, *args, **kwargs):
+            key = None
+            if selector is not None:
+                target = selector(self, *args, **kwargs)
+                key = getattr(target, "name", None) or (str(target) if target is not None else None)
+            start = perf_counter()
+            ok = False
+            try:
+                result = func(self, *args, **kwargs)
+                ok = True
+                return result
+            finally:
+                Metrics.record(op, perf_counter() - start, key, error=not ok)
+        return wrapper
+    return decorator
+
+
+def _element_selector(element, *args, **kwargs):
+    return element.xpath
+
+
+def _xpath_arg(emulator, xpath=None, *args, **kwargs):
+    return xpath
+
+
+class SelectorCache:
+    """选择器编译缓存：每个 xpath 字符串只编译一次为 lxml XPath，整个进程内复用"""
+
+    _compiled: dict[str, etree.XPath] = {}
+    _lock = Lock()
+    hits = 0
+    misses = 0
+
+    @classmethod
+    def get(cls, xpath: str) -> etree.XPath:
+        """获取已编译的选择器，未命中时编译并缓存"""
+        compiled = cls._compiled.get(xpath)
+        if compiled is not None:
+            with cls._lock:  # 多个签到线程同时查询，计数自增不是原子操作
+                cls.hits += 1
+            return compiled
+        with cls._lock:
+            compiled = cls._compiled.get(xpath)
+            if compiled is None:
+                # 与 uiautomator2 一致，支持 re: 正则扩展
+                compiled = etree.XPath(xpath, namespaces={"re": "http://exslt.org/regular-expressions"})
+                cls._compiled[xpath] = compiled
+                cls.misses += 1
+            else:
+                cls.hits += 1
+        return compiled
+
+    @classmethod
+    def stats(cls) -> dict:
+        """返回命中/未命中次数和缓存条目数"""
+        with cls._lock:
+            return {"hits": cls.hits, "misses": cls.misses, "size": len(cls._compiled)}
+
+    @classmethod
+    def clear(cls):
+        """清空缓存和计数"""
+        with cls._lock:
+            cls._compiled.clear()
+            cls.hits = 0
+            cls.misses = 0
+
+
+class UISnapshot:
+    """单次 UI 层级快照：只 dump 一次、lxml 解析一次，同一轮轮询的所有选择器共用这棵树"""
+
+    def __init__(self, xml_content: str):
+        # 与 uiautomator2 PageSource 一致：去除不可见字符，并把 node 标签替换为 class 名，
+        # 这样 //android.widget.TextView[@text='xx'] 形式的 xpath 可直接复用
+        self.xml = re.sub(r'[\u200B-\u200F\uFEFF]', '', xml_content)
+        self.digest = self.hash(xml_content)
+        self._matches = {}  # xpath -> 首个匹配节点，快照不变时直接复用
+        self.root = etree.fromstring(self.xml.encode("utf-8"))
+        for node in self.root.xpath("//node"):
+            node.tag = safe_xmlstr(node.attrib.pop("class", "")) or "node"
+
+    @staticmethod
+    def hash(xml_content: str) -> str:
+        """计算原始层级 XML 的摘要，用于判断界面是否变化"""
+        return hashlib.blake2b(xml_content.encode("utf-8"), digest_size=16).hexdigest()
+
+    def find(self, selector: str | Locator):
+        """返回第一个匹配的节点，不存在返回 None
+
+        selector 为 xpath 字符串时使用编译缓存执行；为 Locator 时按其推导出的最快方式查找
+        """
+        if selector not in self._matches:
+            if isinstance(selector, Locator):
+                node = selector.match(self)
+            else:
+                nodes = SelectorCache.get(selector)(self.root)
+                node = nodes[0] if nodes else None
+            self._matches[selector] = node
+        return self._matches[selector]
+
+    def exists(self, selector: str | Locator) -> bool:
+        """检查元素是否存在于快照中"""
+        return self.find(selector) is not None
+
+    def first_match(self, xpaths: list[str | Locator]) -> str | Locator | None:
+        """按顺序返回第一个存在于快照中的选择器，均不存在返回 None"""
+        for xpath in xpaths:
+            if self.exists(xpath):
+                return xpath
+        return None
+
+    @cached_property
+    def by_text(self) -> dict[str, list]:
+        """text -> 节点列表，首次访问时一次遍历建立索引"""
+        self._build_index()
+        return self.__dict__["by_text"]
+
+    @cached_property
+    def by_resource_id(self) -> dict[str, list]:
+        """resource-id -> 节点列表，与 by_text 在同一次遍历中建立"""
+        self._build_index()
+        return self.__dict__["by_resource_id"]
+
+    def _build_index(self):
+        by_text, by_resource_id = {}, {}
+        for node in self.root.iter():
+            text = node.attrib.get("text")
+            if text:
+                by_text.setdefault(text, []).append(node)
+            rid = node.attrib.get("resource-id")
+            if rid:
+                by_resource_id.setdefault(rid, []).append(node)
+        self.__dict__["by_text"] = by_text
+        self.__dict__["by_resource_id"] = by_resource_id
+
+    @staticmethod
+    def center(node) -> tuple[int, int]:
+        """计算节点 bounds 的中心坐标"""
+        lx, ly, rx, ry = map(int, re.findall(r"\d+", node.attrib.get("bounds", "[0,0][0,0]")))
+        return (lx + rx) // 2, (ly + ry) // 2
+
+
+class DevicePool:
+    """进程级设备连接池：按 serial 保存已连接的 u2 设备，跨多次签到复用
+
+    取用池中连接前做一次短超时的 deviceInfo 调用检查健康，失效的连接直接淘汰后重连；
+    新建的连接在 connect 内部已等到 uiautomator 服务就绪，不再重复检查
+    """
+
+    _devices: dict[str, Device] = {}  # serial -> 已连接的设备
+    _lock = Lock()
+    hits = 0
+    misses = 0
+    evictions = 0
+    HEALTH_TIMEOUT = 2  # 健康检查调用的超时（秒）
+
+    @classmethod
+    def get(cls, serial: str, connect=u2.connect) -> Device:
+        """返回可用的设备连接，池中没有或已失效时调用 connect 新建并放入池中
+
+        连接失败时抛出 connect 的原始异常，由调用方决定是否重试
+        """
+        with cls._lock:
+            device = cls._devices.get(serial)
+        # 健康检查和新建连接较慢，不持有锁；计数在锁内自增，多个签到线程同时取用时不丢失
+        if device is not None:
+            if cls.healthy(device):
+                with cls._lock:
+                    cls.hits += 1
+                return device
+            cls.evict(serial)
+        with cls._lock:
+            cls.misses += 1
+        device = connect(serial=serial)
+        with cls._lock:
+            cls._devices[serial] = device
+        return device
+
+    @classmethod
+    def healthy(cls, device) -> bool:
+        """检查 ADB 连接和 uiautomator 服务是否仍然可用"""
+        try:
+            return bool(device.jsonrpc_call("deviceInfo", timeout=cls.HEALTH_TIMEOUT))
+        except Exception:
+            return False
+
+    @classmethod
+    def evict(cls, serial: str):
+        """从池中移出指定设备的连接"""
+        with cls._lock:
+            if cls._devices.pop(serial, None) is not None:
+                cls.evictions += 1
+
+    @classmethod
+    def stats(cls) -> dict:
+        """返回命中/未命中/淘汰次数和池中设备数"""
+        with cls._lock:
+            return {"hits": cls.hits, "misses": cls.misses, "evictions": cls.evictions, "size": len(cls._devices)}
+
+    @classmethod
+    def clear(cls):
+        """淘汰全部设备并清空计数"""
+        with cls._lock:
+            cls._devices.clear()
+            cls.hits = 0
+            cls.misses = 0
+            cls.evictions = 0
+
+
+class InstanceInfo(NamedTuple):
+    """MuMuManager 报告的单个实例状态，未启动的实例没有 adb_port 和 pid"""
+    index: str
+    name: str
+    running: bool  # 安卓系统已启动完成
+    process_started: bool
+    adb_host: str | None
+    adb_port: int | None
+    pid: int | None
+
+    @property
+    def serial(self) -> str | None:
+        return f"{self.adb_host}:{self.adb_port}" if self.adb_port else None
+
+
+class MuMuManager:
+    """MuMuManager.exe 客户端：一次 info -v all 查询全部实例，结果按 TTL 缓存
+
+    调度和 GUI 选择实例时共用缓存，不必每个实例启动一次子进程
+    """
+
+    ttl = 3.0  # 缓存有效期（秒）
+    _cache: dict[str, tuple[float, dict[str, InstanceInfo]]] = {}  # manager_exe -> (查询时刻, 实例表)
+    _lock = Lock()
+    queries = 0
+
+    @classmethod
+    def instances(cls, manager_exe: str, refresh: bool = False) -> dict[str, InstanceInfo]:
+        """返回 实例编号 -> InstanceInfo，缓存过期或 refresh 时重新查询
+
+        MuMuManager 无法执行时抛出 OSError，输出无法解析时抛出 ValueError
+        """
+        with cls._lock:
+            cached = cls._cache.get(manager_exe)
+            if cached is not None and not refresh and time() - cached[0] < cls.ttl:
+                return cached[1]
+        # 查询可能耗时数秒，不持锁执行，避免阻塞其他线程读取缓存
+        result = subprocess.run([manager_exe, "info", "-v", "all"], stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE, text=True, encoding="utf-8", timeout=10)
+        infos = cls.parse(result.stdout)
+        with cls._lock:
+            cls.queries += 1
+            cls._cache[manager_exe] = (time(), infos)
+        return infos
+
+    @classmethod
+    def get(cls, manager_exe: str, num: str) -> InstanceInfo | None:
+        """返回指定编号的实例，不存在时返回 None"""
+        return cls.instances(manager_exe).get(str(num))
+
+    @staticmethod
+    def parse(output: str) -> dict[str, InstanceInfo]:
+        """解析 info 输出：多个实例时为 编号 -> 信息 的字典，只有一个实例时直接是该实例的信息"""
+        data = json.loads(output)
+        if not isinstance(data, dict):
+            raise ValueError(f"无法解析 MuMuManager 输出: {output[:100]}")
+        records = {data["index"]: data} if "index" in data else {k: v for k, v in data.items() if isinstance(v, dict)}
+        infos = {}
+        for key, r in records.items():
+            info = InstanceInfo(
+                index=str(r.get("index", key)),
+                name=r.get("name", ""),
+                running=bool(r.get("is_android_started", False)),
+                process_started=bool(r.get("is_process_started", False)),
+                adb_host=r.get("adb_host_ip"),
+                adb_port=int(r["adb_port"]) if r.get("adb_port") else None,
+                pid=int(r["pid"]) if r.get("pid") else None,
+            )
+            infos[info.index] = info
+        return infos
+
+    @classmethod
+    def invalidate(cls):
+        """实例开关机后清空缓存"""
+        with cls._lock:
+            cls._cache.clear()
+
+
+class ShellSendError(OSError):
+    """命令未能发送到常驻 shell 会话（命令一定没有执行，可以改用其他方式执行）"""
+
+
+class ShellChannel:
+    """常驻 adb shell 会话：多条命令复用同一条 shell 流，每条命令的输出以带随机串的哨兵行结尾
+
+    省去每条命令单独建立 adb shell 会话的开销；命令发送失败时重连并重发一次，仍失败时抛出 ShellSendError。
+    发送后读取失败或超时时只关闭会话并抛出原异常（命令可能已经执行，重发会重复按键等操作），
+    下一条命令会重新建立会话
+    """
+
+    SENTINEL = "__MUMU_SHELL_DONE__"
+
+    def __init__(self, adb_device, log):
+        self.adb_device = adb_device  # adbutils 设备，开机阶段 uiautomator 尚未就绪时也可使用
+        self.log = log
+        self.opened = 0  # 建立会话的次数
+        self._conn = None
+        self._buf = b""
+        self._lock = Lock()
+
+    def _open(self):
+        self._conn = self.adb_device.shell("sh", stream=True, timeout=None)
+        self._buf = b""
+        self.opened += 1
+
+    def close(self):
+        """关闭会话，下次执行命令时重新建立"""
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except Exception:
+                pass
+        self._conn = None
+
+    def run(self, cmdargs: str | list[str], timeout: float = 10) -> tuple[str, int]:
+        """执行一条命令，返回 (输出, 退出码)"""
+        cmd = cmdargs if isinstance(cmdargs, str) else shlex.join(map(str, cmdargs))
+        marker = f"{self.SENTINEL}{uuid4().hex}".encode()
+        with self._lock:
+            for attempt in (1, 2):
+                try:
+                    if self._conn is None:
+                        self._open()
+                    self._conn.conn.settimeout(timeout)
+                    # 命令的标准输入重定向到 /dev/null，避免吞掉后续命令
+                    self._conn.send(f"{cmd} < /dev/null\necho {marker.decode()}:$?\n".encode("utf-8"))
+                    break
+                except (OSError, AdbError) as e:
+                    self.close()
+                    if attempt == 2:
+                        raise ShellSendError(f"shell 命令发送失败: {str(e)}") from e
+                    self.log.warning(f"shell 会话断开，重新连接: {str(e)}")
+            try:
+                return self._receive(marker)
+            except (OSError, EOFError, AdbError):
+                self.close()
+                raise
+
+    def _receive(self, marker: bytes) -> tuple[str, int]:
+        while marker not in self._buf:
+            chunk = self._conn.recv(4096)
+            if not chunk:
+                raise EOFError("shell 会话已关闭")
+            self._buf += chunk
+        output, _, rest = self._buf.partition(marker)
+        status, _, self._buf = rest.partition(b"\n")
+        code = int(status.lstrip(b":").strip() or 0)
+        return output.decode("utf-8", errors="replace"), code
+
+
+class UIElement:
+    """wait() 返回的元素句柄：携带匹配节点的 bounds 和属性，click/exists/send_keys 不再重新查询设备"""
+
+    def __init__(self, emulator: "Mumu", xpath: str | Locator, node):
+        self.emulator = emulator
+        self.xpath = xpath
+        self.node = node
+        self.attrib = dict(node.attrib) if node is not None else {}
+
+    @property
+    def bounds(self) -> tuple[int, int, int, int]:
+        """(left, top, right, bottom)"""
+        bounds = self.attrib.get("bounds")
+        if not bounds:
+            return (0, 0, 0, 0)
+        lx, ly, rx, ry = map(int, re.findall(r"\d+", bounds))
+        return (lx, ly, rx, ry)
+
+    @property
+    def center(self) -> tuple[int, int]:
+        lx, ly, rx, ry = self.bounds
+        return (lx + rx) // 2, (ly + ry) // 2
+
+    @property
+    def text(self) -> str:
+        return self.attrib.get("text", "")
+
+    @instrumented("exists", _element_selector)
+    def exists(self) -> bool:
+        """检查元素是否存在（等待时已解析，无需再次查询）"""
+        exists = self.node is not None
+        self.emulator.log.info(f"检查元素: {self.xpath} - {'存在' if exists else '不存在'}")
+        return exists
+
+    @instrumented("click", _element_selector)
+    def click(self):
+        """按匹配节点的中心坐标点击，元素不存在时忽略"""
+        if self.node is None:
+            return
+        self.emulator.device.click(*self.center)
+
+    @instrumented("send_keys", _element_selector)
+    def send_keys(self, string: str) -> bool:
+        """发送文本到当前输入框，并按本元素重新读取一次文本确认结果"""
+        return self.emulator.input_text(string, self)
+
 
-    return wrapper
 class Mumu:
-    def __init__(self,):
-        self.serial = Setting.serial
+    use_shell_channel = True  # 是否通过常驻 shell 会话执行 shell 命令
+    shell_channel = None  # 连接后创建的常驻 shell 会话
+    # 连接阶段中视为“设备尚未就绪”、可以重试的异常
+    RETRYABLE_ERRORS = (OSError, ConnectError, AdbShellError, AdbError, LaunchUiAutomationError)
+    HEALTH_LATENCY = 5  # 健康检查中 shell 响应的最长允许耗时（秒）
+    LAUNCH_CONFIRM = 10  # 开机拉起应用后等待其进入前台的最长时间（秒）
+    MASK_CHARS = "•●*·"  # 密码框显示的掩码字符
+    # dumpsys window 中的焦点窗口，如 mCurrentFocus=Window{1a2b u0 com.pkg/com.pkg.MainActivity}
+    FOCUS_PATTERN = re.compile(r"(?:mCurrentFocus|mFocusedApp)=\w+\{[^}]*?\s([\w.]+)/([\w.$]+)")
+    _locations: dict[str, tuple[float, float]] = {}  # serial -> 本次启动后最近一次成功设置的 (纬度, 经度)
+    _launch_activities: dict[str, str] = {}  # 包名 -> 启动 Activity
+
+    def __init__(self, serial: str = None, num: str = None):
+        # 多实例运行时由调用方指定实例，否则使用配置中的 serial / emulator_num
+        self.serial = serial if serial is not None else Setting.serial
+        self.num = str(num if num is not None else Setting.emulator_num)
         self.path=Setting.emulator_path
         self.manager_exe = self.path+"\\MuMuManager.exe"
         self.emulator_exe = self.path+"\\MuMuNxMain.exe"
         self.adb_path = self.path+"\\adb.exe"
         self.log = Log("mumu").logger
         self.timeout = 60
-        self.temp_element = None
         self.device = None
-        
+        self._last_snapshot = None  # 最近一次快照，层级摘要不变时复用其解析结果
+        self._tap_cache = {}  # (页面状态, 选择器, 分辨率) -> 点击坐标
+        self._resolution = None
+        self.connect_timings = {}  # 阶段名 -> (耗时秒数, 尝试次数)
+        self.boot_timings = {}  # 启动阶段 -> 完成时刻（秒）
+
     
-    def connect(self,timeout=60) -> Device | None:
-        start_time=time()
-        while True:  # 持续尝试连接直到成功
-            if time()-start_time >timeout:
-                self.log.error("连接模拟器超时，请检查serial号或先启动模拟器后启动脚本")
-                raise TimeoutError
+    @instrumented("connect")
+    def connect(self, timeout=60) -> Device | None:
+        """分阶段等待设备就绪：ADB 端口可连 -> adb get-state 为 device -> uiautomator 服务可用
+
+        每个阶段按指数退避加随机抖动重试，共用 timeout 秒的总时限；各阶段耗时记录在 connect_timings
+        """
+        deadline = time() + timeout
+        self.connect_timings = {}
+        self._backoff("tcp", self._probe_tcp, deadline)
+        self._backoff("adb", self._probe_adb, deadline)
+        self.device = self._backoff("agent", self._probe_agent, deadline)
+        self._on_connected()
+        summary = ", ".join(f"{k} {v[0]:.2f}s/{v[1]}次" for k, v in self.connect_timings.items())
+        self.log.info(f"设备状态：已连接ADB（{summary}）")
+
+    def _backoff(self, stage: str, probe, deadline: float, base: float = 0.2, cap: float = 3.0):
+        """重试 probe 直到返回真值，两次尝试之间按指数退避并加入抖动；超过 deadline 抛出 TimeoutError
+
+        只把设备未就绪时的常见异常视为可重试，其他异常直接抛出
+        """
+        start = time()
+        delay = base
+        attempts = 0
+        error = None
+        while True:
+            attempts += 1
             try:
-                self.device = u2.connect(serial=self.serial)  # 尝试连接设备
-                self.log.info("设备状态：已连接ADB")
-                return # 返回连接成功的设备实例
-            except ConnectError:
-                continue  # 连接失败则继续尝试
-            except AdbShellError:
-                continue
-            except AdbError as e:
-                if "offline" in str(e):
-                    continue
-            except LaunchUiAutomationError:
-                continue
-            
-    def start_app(self, package_name, timeout=120):
-        
+                result = probe()
+                if result:
+                    self.connect_timings[stage] = (time() - start, attempts)
+                    return result
+            except self.RETRYABLE_ERRORS as e:
+                error = e
+            remaining = deadline - time()
+            if remaining <= 0:
+                self.connect_timings[stage] = (time() - start, attempts)
+                self.log.error(f"连接模拟器超时（阶段 {stage}，尝试 {attempts} 次）：{error or '未就绪'}，"
+                               f"请检查serial号或先启动模拟器后启动脚本")
+                raise TimeoutError(f"连接模拟器超时，阶段: {stage}")
+            sleep(min(remaining, delay * random.uniform(0.5, 1.5)))
+            delay = min(cap, delay * 2)
+
+    def _tcp_address(self) -> tuple[str, int] | None:
+        """serial 为 host:port 形式时返回地址，否则返回 None（如 emulator-5554）"""
+        host, sep, port = str(self.serial).rpartition(":")
+        if not sep or not port.isdigit():
+            return None
+        return host, int(port)
+
+    def _probe_tcp(self) -> bool:
+        """阶段一：模拟器的 ADB 端口是否已监听"""
+        address = self._tcp_address()
+        if address is None:
+            return True
+        with socket.create_connection(address, timeout=1):
+            return True
+
+    def _probe_adb(self) -> bool:
+        """阶段二：adb 是否已识别设备且状态为 device"""
+        if self._tcp_address() is not None:
+            adbutils.adb.connect(self.serial, timeout=2)
+        return adbutils.adb.device(self.serial).get_state() == "device"
+
+    def _probe_agent(self) -> Device | None:
+        """阶段三：uiautomator 服务是否可用，返回连接池中的设备（池中连接已检查过健康，新建连接已就绪）"""
+        return DevicePool.get(self.serial)
+
+    @instrumented("start_app")
+    def start_app(self, package_name, timeout=120, relaunch_after: float = 10, stop: bool = False):
+        """启动应用，以前台应用包名确认启动成功
+
+        确认时的轮询间隔从 0.1 秒开始指数增长到 1 秒；app_start 失败或 relaunch_after 秒内仍未到前台时重新启动
+        stop 为 True 时先结束应用再冷启动（否则应用已在运行时只是回到前台，停留在原来的页面）
+        """
         start_time = time()
+        deadline = start_time + timeout
         attempt = 0
-        # 常见启动失败关键字，出现任一则视为启动失败
-        _FAIL_KEYWORDS = [
-            "error", "failed", "unable", "cannot", "not found",
-            "shell output invalid", "exception", "timeout",
-            "refused", "denied", "killed",
-        ]
         while True:
             attempt += 1
-            elapsed = time() - start_time
-            if elapsed > timeout:
+            try:
+                self._app_start(package_name, stop)
+            except Exception as e:
+                self.log.warning(f"启动应用异常（第 {attempt} 次尝试）: {str(e).lower()}，继续重试...")
+                sleep(max(0, min(deadline - time(), 0.5)))
+            else:
+                if self._wait_foreground(package_name, min(deadline, time() + relaunch_after)):
+                    self.log.info(f"启动应用成功: {package_name}（第 {attempt} 次尝试，{time() - start_time:.2f}s）")
+                    return
+                self.log.warning(f"应用未进入前台（第 {attempt} 次尝试），重新启动...")
+            if time() > deadline:
                 self.log.error(f"启动应用超时（{timeout}秒），已尝试 {attempt} 次")
                 raise TimeoutError(f"启动应用超时：{package_name}")
 
-            try:
-                # 使用 uiautomator2 内置方式启动（内部通过 shell 执行 am start）
-                output = self.device.app_start(package_name)
-                # 检查返回输出中是否包含失败关键字
-                output_str = str(output or "").lower()
-                fail_reason = None
-                for kw in _FAIL_KEYWORDS:
-                    if kw in output_str:
-                        fail_reason = kw
-                        break
-
-                if fail_reason:
-                    self.log.warning(
-                        f"app_start 输出包含失败关键字 '{fail_reason}'（第 {attempt} 次尝试），"
-                        f"继续重试..."
-                    )
-                else:
-                    self.log.info(f"启动应用成功: {package_name}（第 {attempt} 次尝试）")
-                    return
-            except Exception as e:
-                err_str = str(e).lower()
-                self.log.warning(
-                    f"启动应用异常（第 {attempt} 次尝试）: {err_str}，继续重试..."
-                )
+    def _app_start(self, package_name: str, stop: bool = False):
+        """常驻 shell 会话可用时直接用 monkey 拉起应用，否则交给 uiautomator2（内部同样通过 shell 执行 monkey）"""
+        if self.shell_channel is None:
+            self.device.app_start(package_name, stop=stop)
+            return
+        if stop:
+            self.shell(["am", "force-stop", package_name])
+        output = self.shell(["monkey", "-p", package_name, "-c", "android.intent.category.LAUNCHER", "1"])
+        if "monkey aborted" in output or "No activities found" in output:
+            raise RuntimeError(f"启动应用失败: {output.strip()}")
 
-            # 等待 2 秒后重试
-            sleep(2)
-    
-    @only_chained_calls
-    def click(self):
+    def _wait_foreground(self, package_name: str, deadline: float) -> bool:
+        """轮询前台应用直到为 package_name，超过 deadline 返回 False"""
+        delay = 0.1
+        while True:
+            if self._foreground_package() == package_name:
+                return True
+            remaining = deadline - time()
+            if remaining <= 0:
+                return False
+            sleep(min(remaining, delay))
+            delay = min(1.0, delay * 2)
+
+    def _foreground_package(self) -> str | None:
+        """当前前台应用包名：优先经常驻 shell 会话读取 dumpsys window 的焦点窗口，
+        会话不可用时用 app_current，都拿不到时取界面层级根节点的 package"""
         try:
-            self.temp_element.click()
-        except XPathElementNotFoundError:
+            if self.shell_channel is not None:
+                match = self.FOCUS_PATTERN.search(self.shell(["dumpsys", "window", "windows"]))
+                if match:
+                    return match.group(1)
+            else:
+                return self.device.app_current().get("package")
+        except Exception:
             pass
+        try:
+            node = next(iter(self.snapshot().root), None)
+            return node.attrib.get("package") if node is not None else None
+        except Exception:
+            return None
+
+    def foreground_activity(self) -> str | None:
+        """当前前台 Activity 的完整类名，获取失败返回 None"""
+        try:
+            if self.shell_channel is not None:
+                match = self.FOCUS_PATTERN.search(self.shell(["dumpsys", "window", "windows"]))
+                if match is None:
+                    return None
+                package, activity = match.groups()
+            else:
+                current = self.device.app_current()
+                package, activity = current.get("package"), current.get("activity")
+        except Exception:
+            return None
+        return f"{package}{activity}" if activity and activity.startswith(".") else activity
 
-    @only_chained_calls
-    def send_keys(self, string: str):
-        """发送文本到设备"""
+    def launch_activity(self, package_name: str) -> str | None:
+        """应用的启动 Activity（Logo、加载页所在的首个页面），按包名缓存，解析失败返回 None"""
+        if package_name not in self._launch_activities:
+            try:
+                output = self.shell(["cmd", "package", "resolve-activity", "--brief",
+                                     "-c", "android.intent.category.LAUNCHER", package_name])
+            except Exception:
+                return None
+            lines = [line.strip() for line in output.splitlines() if "/" in line]
+            if not lines:
+                return None
+            package, _, activity = lines[-1].partition("/")
+            self._launch_activities[package_name] = f"{package}{activity}" if activity.startswith(".") else activity
+        return self._launch_activities[package_name]
+
+    @instrumented("press_keys")
+    def press_keys(self, keys: list[str | int]):
+        """一次 shell 调用发送一串按键事件（input keyevent 支持多个键码），替代逐个 press 的多次往返"""
+        if keys:
+            self.shell(["input", "keyevent", *map(str, keys)])
+
+    def input_text(self, string: str, element: UIElement = None) -> bool:
+        """发送文本到当前输入框，返回是否成功
+
+        传入元素句柄时重新 dump 一次层级，读取该元素的文本确认输入结果
+        """
         sleep(0.1)
-        for i in range(0, 14, 1):  # 循环发送删除键
-            self.device.press('del')
         try:
+            # 先移到末尾再批量删除，兜底输入法 clear 失败时残留的旧内容
+            self.press_keys(["KEYCODE_MOVE_END"] + ["KEYCODE_DEL"] * 14)
             self.device.send_keys(string, clear=True)
         except Exception as e:
-            pass
+            self.log.warning(f"输入文本失败: {str(e)}")
+            return False
+        if element is None:
+            return True
+        return self._confirm_text(element.xpath, string)
+
+    @classmethod
+    def _is_masked(cls, text: str, string: str) -> bool:
+        """自绘密码框不一定标记 password 属性：除最后一位（输入法会短暂明文显示）外全是掩码字符时按掩码处理"""
+        if not text or len(text) != len(string):
+            return False
+        return all(c in cls.MASK_CHARS for c in text[:-1]) and (text[-1] in cls.MASK_CHARS or text[-1] == string[-1])
+
+    def _confirm_text(self, xpath: str | Locator, string: str) -> bool:
+        """确认输入框的当前文本；密码框文本被掩码，只能按长度确认
+
+        部分设备的密码框不向无障碍服务暴露文本（text 为空），此时无法确认，视为成功
+        """
+        node = self.snapshot().find(xpath)
+        if node is None:
+            self.log.warning(f"输入确认失败: 找不到输入框 {xpath}")
+            return False
+        text = node.attrib.get("text", "")
+        password = node.attrib.get("password") == "true"
+        if password and not text:
+            self.log.info(f"密码框不暴露文本，无法确认输入: {xpath}")
+            return True
+        if password or self._is_masked(text, string):
+            confirmed = len(text) == len(string)
+        else:
+            confirmed = text == string
+        if not confirmed:
+            self.log.warning(f"输入确认失败: {xpath} 当前内容与输入不一致")
+        return confirmed
    
+    @instrumented("dump_hierarchy")
+    def snapshot(self) -> UISnapshot:
+        """dump 一次 UI 层级并解析为快照，一轮轮询中的多个选择器都在这份快照上匹配
+
+        层级摘要与上一次相同时直接返回上一次的快照，跳过重新解析，已有的匹配结果一并复用
+        """
+        xml_content = self.device.dump_hierarchy()
+        last = self._last_snapshot
+        if last is not None and last.digest == UISnapshot.hash(xml_content):
+            return last
+        self._last_snapshot = UISnapshot(xml_content)
+        return self._last_snapshot
+
+    def _on_connected(self):
+        """连接（或重新连接）设备后重置与设备绑定的状态"""
+        self._resolution = None
+        self._open_shell_channel()
+
+    def _open_shell_channel(self):
+        """创建常驻 shell 会话（首次执行命令时才真正建立），已有会话时沿用，断开后由会话自行重连"""
+        if self.use_shell_channel and self.shell_channel is None:
+            self.shell_channel = ShellChannel(adbutils.adb.device(self.serial), self.log)
+
+    @instrumented("shell")
+    def shell(self, cmdargs: str | list[str], timeout: float = 10) -> str:
+        """执行 shell 命令并返回输出
+
+        常驻会话发送失败时本条命令改用单次 adb shell，会话保留，下一条命令重新建立；
+        命令已发送后的读取失败或超时直接抛出，不再重发
+        """
+        if self.shell_channel is not None:
+            try:
+                return self.shell_channel.run(cmdargs, timeout)[0]
+            except ShellSendError as e:
+                self.log.warning(f"常驻 shell 会话不可用，本条命令改为单次执行: {str(e)}")
+        if self.device is None:
+            return adbutils.adb.device(self.serial).shell(cmdargs, timeout=timeout)
+        return self.device.shell(cmdargs, timeout=timeout).output
+
+    @instrumented("screenshot")
+    def screenshot_small(self, scale: float = 0.25, quality: int = 50) -> Image.Image:
+        """在设备端缩放并压缩后截图，传输量远小于完整截图和层级 dump"""
+        data = self.device.jsonrpc.takeScreenshot(scale, quality)
+        if not data:
+            return self.device.screenshot()
+        return Image.open(io.BytesIO(base64.b64decode(data)))
+
+    def _wait_match(self, xpaths: list[str | Locator], timeout: float, poll_interval: float):
+        """等待任一选择器出现，返回 (选择器, 节点)，超时返回 (None, None)
+
+        每轮所有候选都在同一份快照上判断，按 poll_interval 轮询 dump 层级。
+        没有改用无障碍事件唤醒：uiautomator events 与 uiautomator2 服务争用同一个 UiAutomation 注册，
+        两者无法同时运行，因此界面变化最多晚 poll_interval 秒被发现
+        """
+        deadline = time() + timeout
+        while True:
+            snap = self.snapshot()
+            matched = snap.first_match(xpaths)
+            if matched is not None:
+                return matched, snap.find(matched)
+            remaining = deadline - time()
+            if remaining <= 0:
+                return None, None
+            sleep(min(remaining, poll_interval))
+
+    def wait_for(self, xpath: str | Locator, timeout: float = 5, poll_interval: float = 0.2):
+        """等待元素出现，返回匹配节点，超时返回 None"""
+        return self._wait_match([xpath], timeout, poll_interval)[1]
+
+    def wait_any(self, xpaths: list[str | Locator], timeout: float = 5,
+                 poll_interval: float = 0.2) -> tuple[str | Locator | None, UIElement | None]:
+        """等待多个互斥结果中最先出现的一个
+
+        Returns:
+            (命中的选择器, 元素句柄)；同一快照中多个命中时按 xpaths 顺序取第一个，超时返回 (None, None)
+        """
+        matched, node = self._wait_match(list(xpaths), timeout, poll_interval)
+        if matched is None:
+            self.log.info(f"元素均未出现: {list(xpaths)}")
+            return None, None
+        self.log.info(f"元素出现: {matched}")
+        return matched, UIElement(self, matched, node)
+
+    def wait_change(self, timeout: float = 5, interval: float = 0.2) -> UISnapshot | None:
+        """等待界面发生变化，返回变化后的快照；超时未变化返回 None"""
+        base = self._last_snapshot or self.snapshot()
+        deadline = time() + timeout
+        while True:
+            snap = self.snapshot()
+            if snap.digest != base.digest:
+                return snap
+            remaining = deadline - time()
+            if remaining <= 0:
+                return None
+            sleep(min(remaining, interval))
+
+    @property
+    def resolution(self) -> tuple[int, int]:
+        """设备分辨率，每次连接只查询一次"""
+        if self._resolution is None:
+            self._resolution = tuple(self.device.window_size())
+        return self._resolution
+
+    def click_cached(self, xpath: str | Locator, state: str, confirm: str | Locator, timeout: float = 5,
+                     confirm_timeout: float = 3) -> bool:
+        """点击稳定的导航元素：命中坐标缓存时直接按坐标点击，再用一次检查确认结果
+
+        Args:
+            xpath: 要点击的元素
+            state: 点击前所处的页面状态，与选择器、分辨率一起作为缓存键
+            confirm: 点击生效后应出现的元素，确认失败时清除缓存并回退为查找后点击
+        Returns:
+            是否完成点击（元素不存在时返回 False）
+        """
+        key = (state, xpath, self.resolution)
+        coords = self._tap_cache.get(key)
+        if coords is not None:
+            self.device.click(*coords)
+            if self.wait_for(confirm, timeout=confirm_timeout) is not None:
+                self.log.info(f"按缓存坐标点击: {xpath} {coords}")
+                return True
+            self.log.warning(f"缓存坐标点击未生效，清除缓存: {xpath}")
+            self._tap_cache.pop(key, None)
+
+        node = self.wait_for(xpath, timeout=timeout)
+        if node is None:
+            self.log.warning(f"元素不存在，无法点击: {xpath}")
+            return False
+        self._tap_cache[key] = UISnapshot.center(node)
+        self.tap(node)
+        return True
+
+    @instrumented("tap")
+    def tap(self, node):
+        """点击快照中的节点（按 bounds 中心坐标），无需再次查询设备"""
+        x, y = UISnapshot.center(node)
+        self.device.click(x, y)
+
     def start_emulator(self):
-        """启动模拟器"""
-        Thread(target=subprocess.run,args=([self.emulator_exe,"-v",Setting.emulator_num],)).start() # 启动模拟器进程
+        """启动模拟器，实例已在运行时直接连接"""
+        if not self.is_running():
+            self._spawn_emulator()
         self.connect()
+
+    def _spawn_emulator(self):
+        """在后台线程中启动模拟器进程，不等待开机"""
+        Mumu._locations.pop(self.serial, None)  # 重新开机后虚拟位置需要重新设置
+        Thread(target=subprocess.run,args=([self.emulator_exe,"-v",self.num],)).start() # 启动模拟器进程
+
+    def is_running(self) -> bool:
+        """实例是否已开机：ADB 端口可连且 adb 状态为 device，只探测一次不重试"""
+        try:
+            return bool(self._probe_tcp() and self._probe_adb())
+        except self.RETRYABLE_ERRORS:
+            return False
+
+    def health(self) -> bool:
+        """通过 ADB 检查实例健康：已开机、系统启动完成且 shell 在 HEALTH_LATENCY 秒内响应"""
+        if not self.is_running():
+            return False
+        start = time()
+        self._open_shell_channel()
+        try:
+            booted = self.shell(["getprop", "sys.boot_completed"], timeout=self.HEALTH_LATENCY)
+        except self.RETRYABLE_ERRORS:
+            return False
+        return booted.strip() == "1" and time() - start < self.HEALTH_LATENCY
+
+    def instance_info(self) -> InstanceInfo | None:
+        """通过 MuMuManager 查询本实例状态（与其他实例共用一次批量查询的缓存）"""
+        return MuMuManager.get(self.manager_exe, self.num)
+
+    def recycle(self):
+        """回收实例：断开池中的连接，通过 MuMuManager 关机后重新开机"""
+        self.log.warning(f"回收模拟器实例 {self.num}（{self.serial}）")
+        DevicePool.evict(self.serial)
+        if self.shell_channel is not None:
+            self.shell_channel.close()
+            self.shell_channel = None
+        try:
+            subprocess.run([self.manager_exe, "control", "-v", self.num, "shutdown"],
+                           stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=30)
+        except subprocess.TimeoutExpired:
+            self.log.error(f"关闭模拟器实例 {self.num} 超时")
+        MuMuManager.invalidate()
+        self._spawn_emulator()
+
+    @instrumented("boot")
+    def boot(self, package_name: str, prepare=None, timeout: float = 120) -> dict[str, float]:
+        """流水线启动：模拟器开机的同时执行准备工作、预热 uiautomator，包管理器就绪后立即拉起应用
+
+        prepare 为后台执行的准备函数（配置校验、选择器编译等），其异常在启动结束时重新抛出
+        返回各阶段完成时刻（相对开始的秒数），同时记录在 boot_timings
+        """
+        start = time()
+        deadline = start + timeout
+        # 实例可能在两次运行之间被外部重启（虚拟位置随之丢失），位置缓存只在本次启动内有效
+        Mumu._locations.pop(self.serial, None)
+        self.boot_timings = {}
+        self.connect_timings = {}
+        self.device = None
+        errors = []
+
+        def mark(phase: str):
+            self.boot_timings[phase] = time() - start
+
+        def background(phase: str, func):
+            try:
+                func()
+                mark(phase)
+            except BaseException as e:
+                errors.append(e)
+
+        def warm_agent():
+            self.device = self._backoff("agent", self._probe_agent, deadline)
+
+        # 保温池或上一次运行留下的实例已开机时跳过冷启动
+        if self.is_running():
+            mark("warm")
+        else:
+            self._spawn_emulator()
+        workers = []
+        if prepare is not None:
+            workers.append(Thread(target=background, args=("prepare", prepare), daemon=True))
+            workers[-1].start()
+        self._backoff("tcp", self._probe_tcp, deadline)
+        mark("tcp")
+        self._backoff("adb", self._probe_adb, deadline)
+        mark("adb")
+        self._open_shell_channel()  # 包管理器探测等开机阶段的 shell 命令也复用常驻会话
+        # uiautomator 安装和启动较慢，与等待包管理器、拉起应用并行进行
+        workers.append(Thread(target=background, args=("agent", warm_agent), daemon=True))
+        workers[-1].start()
+        self._backoff("package_manager", lambda: self._probe_package(package_name), deadline)
+        mark("package_manager")
+        self._launch(package_name)
+        mark("launch")
+        for worker in workers:
+            worker.join(max(0, deadline - time()))
+        if errors:
+            raise errors[0]
+        if self.device is None:
+            raise TimeoutError("等待 uiautomator 服务超时")
+
+        self._on_connected()
+        # 应用已由 _launch 拉起，这里只确认到达前台，未到前台时才经 start_app 重新启动
+        if not self._wait_foreground(package_name, min(deadline, time() + self.LAUNCH_CONFIRM)):
+            self.log.warning(f"应用未进入前台，重新启动: {package_name}")
+            self.start_app(package_name, timeout=max(deadline - time(), self.LAUNCH_CONFIRM))
+        mark("app")
+        summary = ", ".join(f"{k} {v:.2f}s" for k, v in self.boot_timings.items())
+        self.log.info(f"启动完成（{summary}）")
+        return self.boot_timings
+
+    def _probe_package(self, package_name: str) -> bool:
+        """包管理器是否已就绪并能查到应用"""
+        return self.shell(["pm", "path", package_name]).startswith("package:")
+
+    def _launch(self, package_name: str):
+        """不经过 uiautomator 直接通过 adb 拉起应用"""
+        adbutils.adb.device(self.serial).app_start(package_name)
     
-    def set_vitual_location(self, latitude: float=None, longitude: float=None):
-        """设置模拟器的虚拟位置"""
+    @instrumented("set_vitual_location")
+    def set_vitual_location(self, latitude: float=None, longitude: float=None, force: bool = False):
+        """设置模拟器的虚拟位置，与本实例上次设置的位置相同时跳过（force 为 True 时总是设置）"""
         if latitude is None:
             latitude = Setting.location.get("latitude", 111)
         if longitude is None:
             longitude = Setting.location.get("longitude", 111)
+        if not force and Mumu._locations.get(self.serial) == (float(latitude), float(longitude)):
+            self.log.info(f"虚拟位置未变化，跳过设置: 纬度 {latitude}, 经度 {longitude}")
+            return
+        self._apply_location(latitude, longitude)
+        Mumu._locations[self.serial] = (float(latitude), float(longitude))
 
+    def _apply_location(self, latitude: float, longitude: float):
+        """通过 MuMuManager 设置虚拟位置，失败时抛出 RuntimeError"""
         command = [
-            self.manager_exe, "control", "-v", str(Setting.emulator_num),
+            self.manager_exe, "control", "-v", self.num,
             "tool", "location", "-lon", str(longitude), "-lat", str(latitude)
         ]
         self.log.info(f"执行定位命令: {' '.join(command)}")
@@ -148,26 +1045,24 @@ class Mumu:
             self.log.error(f"设置虚拟位置失败: {err_msg}")
             raise RuntimeError(f"设置虚拟位置失败: {err_msg}")
         
-    def wait(self,xpath,timeout=5):
-        """等待元素出现"""
+    @instrumented("wait", _xpath_arg)
+    def wait(self, xpath: str | Locator, timeout: float = None) -> UIElement:
+        """等待元素出现，返回已解析的元素句柄（超时则句柄 exists() 为 False）
+
+        timeout 为 None 时使用 Locator 的默认超时，xpath 字符串默认 5 秒
+        """
+        if timeout is None:
+            timeout = xpath.timeout if isinstance(xpath, Locator) else 5
+        start = time()
         try:
-            self.device.xpath(xpath).wait(timeout=timeout)
-            
+            node = self.wait_for(xpath, timeout=timeout)
         except Exception as e:
             self.log.error(f"等待元素失败: {str(e)}")
             raise
-        else:
+        if isinstance(xpath, Locator):
+            xpath.record_wait(time() - start, node is not None)
+        if node is not None:
             self.log.info(f"元素出现: {xpath}")
-            self.temp_element = self.device.xpath(xpath)
-            return self
-    @only_chained_calls
-    def exists(self):
-        """检查元素是否存在"""
-        try:
-            output=str(self.temp_element).replace('#(XPath("',"").replace('"))','')
-            exists = self.device.xpath(self.temp_element).exists
-            self.log.info(f"检查元素: {output} - {'存在' if exists else '不存在'}")
-            return exists
-        except Exception as e:
-            self.log.error(f"检查元素存在失败: {str(e)}")
-            raise
\ No newline at end of file
+        else:
+            self.log.info(f"元素未出现: {xpath}")
+        return UIElement(self, xpath, node)
@@ -0,0 +1,135 @@
+import subprocess
+from threading import Thread, Lock, Event, Condition
+from time import time
+from Log import Log
+from emulator.mumu import MuMuManager
+
+
+class EmulatorPool:
+    """模拟器保温池：在两次签到之间保持前 size 个实例开机，后台定期通过 ADB 做健康检查
+
+    偶发的检查失败只计数，连续 max_failures 次不健康才回收（关机后重新开机）；
+    签到正在使用的实例（acquire 后未 release）跳过检查，不会在运行中被回收；
+    回收进行中的实例 acquire 会等待回收结束
+    """
+
+    _members: dict[str, object] = {}  # emulator_num -> Mumu
+    _failures: dict[str, int] = {}  # emulator_num -> 连续不健康次数
+    _busy: set[str] = set()
+    _recycling: set[str] = set()
+    _lock = Lock()
+    _cond = Condition(_lock)
+    _stop = Event()
+    _thread = None
+    log = Log("pool").logger
+    checks = 0
+    recycles = 0
+    last_check = None
+
+    @classmethod
+    def start(cls, factory, instances: list[tuple[str, str]], size: int, interval: float = 60,
+              max_failures: int = 3):
+        """启动后台线程：先为前 size 个实例开机，之后定期健康检查；已在运行时先停止旧线程
+
+        查询实例状态和开机都在后台线程中进行，调用方（GUI 主线程）不会被阻塞
+        """
+        cls.stop()
+        with cls._lock:
+            cls._members = {num: factory(serial=serial, num=num) for serial, num in instances[:size]}
+            cls._failures = {num: 0 for num in cls._members}
+        if not cls._members:
+            return
+        cls._stop.clear()
+        cls._thread = Thread(target=cls._monitor, args=(interval, max_failures), name="emulator-pool", daemon=True)
+        cls._thread.start()
+        cls.log.info(f"模拟器保温池已启动: 实例 {list(cls._members)}，每 {interval}s 检查一次")
+
+    @classmethod
+    def warm(cls):
+        """开机池中尚未运行的实例，不等待开机完成
+
+        先用 MuMuManager 一次查询全部实例的状态，查询失败时逐个通过 ADB 探测
+        """
+        members = list(cls._members.items())
+        try:
+            infos = MuMuManager.instances(members[0][1].manager_exe) if members else {}
+        except (OSError, ValueError, subprocess.SubprocessError) as e:
+            cls.log.warning(f"MuMuManager 查询实例状态失败，改用 ADB 探测: {str(e)}")
+            infos = None
+        for num, emulator in members:
+            info = infos.get(num) if infos is not None else None
+            running = info.process_started if info is not None else emulator.is_running()
+            if not running:
+                cls.log.info(f"预热模拟器实例 {num}")
+                emulator._spawn_emulator()
+
+    @classmethod
+    def check(cls, max_failures: int = 3) -> dict[str, bool]:
+        """对空闲实例做一轮健康检查，连续不健康达到 max_failures 次的实例被回收，返回 实例 -> 是否健康"""
+        results = {}
+        for num, emulator in list(cls._members.items()):
+            with cls._lock:
+                if num in cls._busy:
+                    continue
+            healthy = emulator.health()
+            with cls._lock:
+                if num in cls._busy:
+                    continue  # 检查期间被签到占用，结果作废
+                results[num] = healthy
+                cls._failures[num] = 0 if healthy else cls._failures.get(num, 0) + 1
+                degraded = cls._failures[num] >= max_failures
+                if degraded:
+                    # 在同一把锁内标记为回收中，之后的 acquire 会等待回收结束
+                    cls._failures[num] = 0
+                    cls._recycling.add(num)
+            if degraded:
+                cls.recycles += 1
+                try:
+                    emulator.recycle()
+                finally:
+                    with cls._cond:
+                        cls._recycling.discard(num)
+                        cls._cond.notify_all()
+            elif not healthy:
+                cls.log.warning(f"模拟器实例 {num} 健康检查失败（连续 {cls._failures[num]} 次）")
+        cls.checks += 1
+        cls.last_check = time()
+        return results
+
+    @classmethod
+    def _monitor(cls, interval: float, max_failures: int):
+        try:
+            cls.warm()
+        except Exception as e:
+            cls.log.error(f"预热模拟器异常: {str(e)}")
+        while not cls._stop.wait(interval):
+            try:
+                cls.check(max_failures)
+            except Exception as e:
+                cls.log.error(f"模拟器健康检查异常: {str(e)}")
+
+    @classmethod
+    def acquire(cls, num: str):
+        """签到开始使用实例，期间跳过其健康检查；实例正在回收时等待回收结束"""
+        with cls._cond:
+            cls._cond.wait_for(lambda: str(num) not in cls._recycling)
+            cls._busy.add(str(num))
+
+    @classmethod
+    def release(cls, num: str):
+        with cls._lock:
+            cls._busy.discard(str(num))
+
+    @classmethod
+    def stop(cls):
+        """停止后台检查线程，模拟器保持运行"""
+        cls._stop.set()
+        if cls._thread is not None:
+            cls._thread.join(timeout=5)
+            cls._thread = None
+
+    @classmethod
+    def stats(cls) -> dict:
+        """返回池中实例、检查轮数和回收次数"""
+        return {"instances": list(cls._members), "checks": cls.checks, "recycles": cls.recycles,
+                "failures": dict(cls._failures)}
@@ -0,0 +1,220 @@
+"""
+离线回放设备：用录制的 UI 层级 XML 驱动签到流程，无需真实 MuMu 模拟器
+- ReplayDevice 实现 Mumu 用到的 uiautomator2 设备接口子集（xpath / click / send_keys / press / shell / app_start / dump_hierarchy）
+- 页面按场景脚本（scenario.json）组成状态机：点击某个文本或 resource-id 后切换到下一个页面
+- 每种调用可配置模拟延迟，用于在 Linux 上对 Deli.run 做端到端基准测试和性能分析
+"""
+
+import json
+import os
+import re
+from collections import Counter
+from threading import Lock
+from time import sleep
+
+from lxml import etree
+from uiautomator2.abstract import ShellResponse
+from uiautomator2.xpath import XPathEntry
+
+from emulator.mumu import Mumu
+from Setting import Setting
+
+# 仓库自带的得力 E+ 录制场景，fake 后端未配置 replay_scenario 时使用
+DEFAULT_SCENARIO = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "debug", "replay", "eplus")
+
+# 应用退出后看到的桌面
+LAUNCHER_XML = ('<hierarchy rotation="0"><node class="android.widget.FrameLayout" package="com.android.launcher"'
+                ' text="" resource-id="" bounds="[0,0][720,1280]" /></hierarchy>')
+
+
+class ReplayDevice:
+    """按场景脚本回放录制页面的伪设备
+
+    Args:
+        screens: 页面名 -> 层级 XML
+        transitions: 页面名 -> {点击目标的 text 或 resource-id: 下一个页面名}
+        back: 页面名 -> 按返回键后的页面名，未列出的页面按返回键不变
+        start: 初始页面
+        launch: app_start 后进入的页面，默认与 start 相同
+        package: app_current 返回的包名
+        latency: 调用名 -> 每次调用的模拟延迟（秒）
+    """
+
+    def __init__(self, screens: dict[str, str], transitions: dict[str, dict[str, str]], start: str,
+                 launch: str = None, package: str = "", latency: dict[str, float] = None,
+                 back: dict[str, str] = None):
+        self.screens = {name: etree.fromstring(xml.encode("utf-8")) for name, xml in screens.items()}
+        self.transitions = transitions
+        self.back = back or {}
+        self.current = start
+        self.launch = launch or start
+        self.package = package
+        self.latency = dict(latency or {})
+        self.calls = Counter()  # 调用名 -> 调用次数
+        self.wait_timeout = 20.0  # XPathEntry 需要
+        self.xpath = XPathEntry(self)
+        self._focused = None  # 当前获得焦点的输入框节点
+        self.started = False  # 应用是否已启动过，之后不带 stop 的 app_start 不会回到启动页
+        self.exited = False  # 在启动页按返回键后应用退到桌面，app_current 返回桌面包名
+        self._lock = Lock()
+
+    @classmethod
+    def load(cls, scenario_dir: str, latency: dict[str, float] = None) -> "ReplayDevice":
+        """从场景目录加载（目录下需有 scenario.json 及其引用的 XML 文件）"""
+        with open(os.path.join(scenario_dir, "scenario.json"), "r", encoding="utf-8") as f:
+            scenario = json.load(f)
+        screens = {}
+        for name, filename in scenario["screens"].items():
+            with open(os.path.join(scenario_dir, filename), "r", encoding="utf-8") as f:
+                screens[name] = f.read()
+        merged_latency = dict(scenario.get("latency", {}))
+        merged_latency.update(latency or {})
+        return cls(screens, scenario.get("transitions", {}), scenario["start"],
+                   launch=scenario.get("launch"), package=scenario.get("package", ""),
+                   latency=merged_latency, back=scenario.get("back"))
+
+    def _call(self, name: str):
+        self.calls[name] += 1
+        delay = self.latency.get(name, 0)
+        if delay:
+            sleep(delay)
+
+    @staticmethod
+    def _bounds(node) -> tuple[int, int, int, int]:
+        bounds = node.attrib.get("bounds")
+        if not bounds:
+            return (0, 0, 0, 0)
+        lx, ly, rx, ry = map(int, re.findall(r"\d+", bounds))
+        return (lx, ly, rx, ry)
+
+    def _hit(self, x: int, y: int) -> list:
+        """返回包含坐标点的节点，最深（最上层）的排在最前"""
+        hits = []
+        for node in self.screens[self.current].iter("node"):
+            lx, ly, rx, ry = self._bounds(node)
+            if lx <= x <= rx and ly <= y <= ry:
+                hits.append(node)
+        return list(reversed(hits))
+
+    # ---------- uiautomator2 设备接口子集 ----------
+    def dump_hierarchy(self, compressed=False, pretty=False, max_depth=None) -> str:
+        self._call("dump_hierarchy")
+        with self._lock:
+            body = LAUNCHER_XML if self.exited else etree.tostring(self.screens[self.current], encoding="unicode")
+        return "<?xml version='1.0' encoding='UTF-8' standalone='yes' ?>\n" + body
+
+    def click(self, x, y):
+        self._call("click")
+        with self._lock:
+            hits = self._hit(int(x), int(y))
+            if hits and hits[0].attrib.get("class") == "android.widget.EditText":
+                self._focused = hits[0]
+            routes = self.transitions.get(self.current, {})
+            for node in hits:
+                for key in (node.attrib.get("text"), node.attrib.get("resource-id")):
+                    if key and key in routes:
+                        self.current = routes[key]
+                        self._focused = None
+                        return
+
+    def long_click(self, x, y):
+        self.click(x, y)
+
+    def send_keys(self, text: str, clear: bool = False):
+        self._call("send_keys")
+        with self._lock:
+            if self._focused is None:
+                return
+            old = "" if clear else self._focused.attrib.get("text", "")
+            self._focused.attrib["text"] = old + text
+
+    def clear_text(self):
+        self._call("clear_text")
+        with self._lock:
+            if self._focused is not None:
+                self._focused.attrib["text"] = ""
+
+    def press(self, key, meta=None):
+        self._call("press")
+        with self._lock:
+            self._key(key)
+
+    def _key(self, key):
+        """处理一个按键：DEL 删除输入框末尾字符，BACK 按场景的 back 表返回上一页，在启动页按 BACK 退出应用"""
+        if key in ("del", "delete", 67, "67", "KEYCODE_DEL") and self._focused is not None:
+            self._focused.attrib["text"] = self._focused.attrib.get("text", "")[:-1]
+        elif key in ("back", 4, "4", "KEYCODE_BACK"):
+            if self.current in self.back:
+                self.current = self.back[self.current]
+                self._focused = None
+            elif self.current == self.launch:
+                self.exited = True
+
+    def shell(self, cmdargs: str | list[str], timeout=60) -> ShellResponse:
+        """只支持 input keyevent（DEL、BACK），其余命令返回空输出"""
+        self._call("shell")
+        args = cmdargs.split() if isinstance(cmdargs, str) else list(cmdargs)
+        if args[:2] == ["input", "keyevent"]:
+            with self._lock:
+                for key in args[2:]:
+                    self._key(key)
+        return ShellResponse("", 0)
+
+    def app_start(self, package_name: str, activity: str = None, wait: bool = False, stop: bool = False, use_monkey: bool = False):
+        """与真实设备一致：应用已在运行且 stop 为 False 时只回到前台，停留在当前页面"""
+        self._call("app_start")
+        with self._lock:
+            if stop or not self.started or self.exited:
+                self.current = self.launch
+                self._focused = None
+            self.started = True
+            self.exited = False
+
+    def app_current(self) -> dict:
+        self._call("app_current")
+        if self.exited:
+            return {"package": "com.android.launcher", "activity": ".Launcher", "pid": 0}
+        return {"package": self.package, "activity": self.current, "pid": 0}
+
+    def window_size(self) -> tuple[int, int]:
+        self._call("window_size")
+        root = self.screens[self.current].find("node")
+        lx, ly, rx, ry = self._bounds(root if root is not None else self.screens[self.current])
+        return rx - lx, ry - ly
+
+
+class ReplayMumu(Mumu):
+    """连接到 ReplayDevice 的 Mumu：不启动模拟器、不调用 adb 和 MuMuManager，其余逻辑与 Mumu 完全一致"""
+
+    use_shell_channel = False  # 回放设备没有 adb，shell 命令直接交给 ReplayDevice.shell
+
+    def __init__(self, scenario_dir: str = None, latency: dict[str, float] = None, serial: str = None, num: str = None):
+        super().__init__(serial, num)
+        self.scenario_dir = scenario_dir or Setting.replay_scenario or DEFAULT_SCENARIO
+        self.latency = latency
+
+    # 启动和连接的各阶段探测直接视为就绪，agent 阶段返回回放设备
+    def _spawn_emulator(self):
+        pass
+
+    def _probe_tcp(self) -> bool:
+        return True
+
+    def _probe_adb(self) -> bool:
+        return True
+
+    def _probe_agent(self) -> ReplayDevice:
+        self.log.info(f"设备状态：已连接回放设备 {self.scenario_dir}")
+        return ReplayDevice.load(self.scenario_dir, self.latency)
+
+    def _probe_package(self, package_name: str) -> bool:
+        return True
+
+    def _launch(self, package_name: str):
+        pass  # 回放设备从场景的 start 页面开始，视为应用已拉起
+
+    def set_vitual_location(self, latitude: float = None, longitude: float = None, force: bool = False):
+        self.log.info("回放设备忽略虚拟定位")
+
+    def launch_activity(self, package_name: str) -> str:
+        return self.device.launch  # 回放设备的 Activity 即页面名
@@ -6,6 +6,7 @@
 import ctypes
 import sys
 import os
+import subprocess
 
 # ---------- Windows DPI 感知（必须在创建任何 tk 窗口前调用） ----------
 if sys.platform == "win32":
@@ -31,9 +32,11 @@ else:
     SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, SCRIPT_DIR)
 
-from Setting import DEFAULT_CONFIG, CONFIG_PATH, load_config, save_config, reload_config
+from Setting import Setting, DEFAULT_CONFIG, CONFIG_PATH, load_config, save_config, reload_config
 from Log import Log
 from deliSignup import Deli
+from emulator.pool import EmulatorPool
+from emulator.mumu import MuMuManager
 
 
 # ---------- 字体（整体放大） ----------
@@ -430,6 +433,8 @@ class DeliSignupApp:
         self._current_page = None
         self._sign_started = False
         self._last_error = None  # (error_msg, traceback_str) 持久化错误状态，切换页面后保持
+        self._instance_check = (None, [])  # ((路径, 序列号, 编号), 错误列表) 最近一次后台核对实例的结果
+        self._instance_check_job = None
 
         # 持久化签到进度状态（切换页面后恢复 UI）
         self._progress_state = {
@@ -443,6 +448,7 @@ class DeliSignupApp:
 
         self._build_ui()
         self._poll_log_queue()
+        self._start_emulator_pool()
 
         # 设置关闭协议
         self.root.protocol("WM_DELETE_WINDOW", self._on_close)
@@ -538,10 +544,22 @@ class DeliSignupApp:
         spacer.pack(fill="both", expand=True)
 
     # ==================== 窗口操作 ====================
+    def _start_emulator_pool(self):
+        """配置了 warm_instances 时在后台保持模拟器开机，下次签到跳过冷启动"""
+        size = int(Setting.warm_instances or 0)
+        if size <= 0:
+            return
+        try:
+            factory = Deli().select_emulator()
+            EmulatorPool.start(factory, Setting.instances(), size, interval=float(Setting.health_interval))
+        except (TypeError, ValueError) as e:
+            Log("gui").logger.warning(f"模拟器保温池未启动: {str(e)}")
+
     def _on_close(self):
         if self._sign_thread and self._sign_thread.is_alive():
             if self._deli_instance:
                 self._deli_instance.stop()
+        EmulatorPool.stop()
         self.root.destroy()
 
     # ==================== 页面切换 ====================
@@ -1009,7 +1027,7 @@ class DeliSignupApp:
         self.root.after(0, _do)
 
     def _run_signup(self):
-        """在子线程中运行签到流程，按细化阶段更新进度"""
+        """在子线程中运行签到流程（与命令行共用 Deli.run），按细化阶段更新进度"""
         try:
             self._deli_instance = Deli()
             # 从配置读取 debugmode
@@ -1025,149 +1043,38 @@ class DeliSignupApp:
             base_stages = 5  # 初始化 + 连接 + 启动模拟器 + 启动应用 + 启动页面
             total_stages = base_stages + user_count * stages_per_user
             self._update_step(1, total_stages, "重新加载配置文件...", "初始化配置")
+            Setting.reload()
+            instances = Setting.instances()
+            if len(instances) > 1:
+                # 多实例并行签到：进度按整体显示，各用户结果见日志
+                self._update_step(3, 4, f"使用 {len(instances)} 个模拟器实例并行签到...", "并行签到")
+            else:
+                # 启动模拟器期间没有步骤回调；STARTUP 流程的第一个步骤即表示模拟器和应用已启动
+                self._update_step(3, total_stages, "正在启动模拟器...", "启动模拟器")
+                self._deli_instance.engine.on_step = lambda step, ctx: \
+                    self._update_step(5, total_stages, f"处理应用启动页面: {step.label}", "启动页面")
+
+                def on_user(idx, username):
+                    base = base_stages + idx * stages_per_user
+                    stage = f"用户签到 ({idx+1}/{user_count})"
+                    self._deli_instance.engine.on_step = lambda step, ctx: \
+                        self._update_step(base + step.progress, total_stages, step.label.format(**ctx), stage)
+
+                self._deli_instance.on_user = on_user
+
+            success = self._deli_instance.run()
+            if self._deli_instance._stop_flag:
+                self.root.after(0, lambda: self._on_sign_finished(False))
+                return
+            failed = {u: r for u, r in self._deli_instance.results.items() if r is not True}
+            if failed:
+                error = "以下用户签到失败: " + "; ".join(f"{u}（{r}）" for u, r in failed.items())
+            else:
+                error = "" if success else "签到失败，详见日志"
+            if success:
+                self._update_step(total_stages, total_stages, "所有用户签到完成", "完成")
+            self.root.after(0, lambda: self._on_sign_finished(success, error))
 
-            import time
-            time.sleep(0.05)
-
-            # --- 阶段 2: 初始化模拟器 ---
-            self._update_step(2, total_stages, "正在初始化模拟器连接...", "连接模拟器")
-            self._deli_instance.emulator = self._deli_instance.select_emulator()()
-
-            # --- 阶段 3: 启动模拟器 ---
-            self._update_step(3, total_stages, "正在启动模拟器...", "启动模拟器")
-            self._deli_instance.emulator.start_emulator()
-
-            # --- 阶段 4: 启动应用 ---
-            self._update_step(4, total_stages, "正在启动得力 E+ 应用...", "启动应用")
-            self._deli_instance.emulator.start_app(self._deli_instance.deli_package_name)
-
-            # --- 阶段 5: 处理启动页面 ---
-            self._update_step(5, total_stages, "处理应用启动页面...", "启动页面")
-            self._deli_instance._check_stop()
-            while True:
-                self._deli_instance._check_stop()
-                if self._deli_instance.emulator.wait(
-                    "//android.widget.TextView[@text='跳过']", timeout=0.5
-                ).exists():
-                    self._deli_instance.emulator.wait(
-                        "//android.widget.TextView[@text='跳过']", timeout=0.5
-                    ).click()
-                    self._deli_instance.check_login_invaild()
-                if self._deli_instance.emulator.wait(
-                    "//android.widget.TextView[@text='我的']", timeout=0.3
-                ).exists():
-                    self._deli_instance.check_login_invaild()
-                    self._deli_instance.emulator.wait("//android.widget.TextView[@text='我的']").click()
-                    self._deli_instance.check_login_invaild()
-                    self._deli_instance.emulator.wait("//android.widget.TextView[@text='设置']").click()
-                    self._deli_instance.check_login_invaild()
-                    self._deli_instance.emulator.wait("//android.widget.TextView[@text='退出登录']").click()
-                    self._deli_instance.emulator.wait("//android.widget.TextView[@text='确定']").click()
-                if self._deli_instance.emulator.wait(
-                    "//android.widget.TextView[@text='登录']", timeout=0.3
-                ).exists():
-                    break
-
-            # --- 逐个用户签到（细化子阶段） ---
-            for idx, user in enumerate(users.items()):
-                self._deli_instance._check_stop()
-                username, password = user[0], user[1]
-                base_num = base_stages + idx * stages_per_user
-
-                # 子阶段 1: 输入账号
-                self._update_step(base_num + 1, total_stages,
-                                  f"输入账号: {username}", f"用户签到 ({idx+1}/{user_count})")
-                self._deli_instance.emulator.wait(
-                    "//android.widget.EditText[@resource-id='com.delicloud.app.smartoffice:id/et_phone']"
-                ).click()
-                self._deli_instance.emulator.wait(
-                    "//android.widget.EditText[@resource-id='com.delicloud.app.smartoffice:id/et_phone']"
-                ).send_keys(username)
-
-                # 子阶段 2: 输入密码
-                self._update_step(base_num + 2, total_stages,
-                                  "输入密码...", f"用户签到 ({idx+1}/{user_count})")
-                self._deli_instance.emulator.wait("//android.widget.EditText[@resource-id='com.delicloud.app.smartoffice:id/et_password']").click()
-                self._deli_instance.emulator.wait("//android.widget.EditText[@resource-id='com.delicloud.app.smartoffice:id/et_password']").send_keys(password)
-
-                # 子阶段 3: 点击登录
-                self._update_step(base_num + 3, total_stages,
-                                  "点击登录按钮...", f"用户签到 ({idx+1}/{user_count})")
-                self._deli_instance.emulator.wait("//android.widget.TextView[@text='登录']").click()
-
-                # 子阶段 4: 设置虚拟位置
-                self._update_step(base_num + 4, total_stages,
-                                  "设置虚拟定位...", f"用户签到 ({idx+1}/{user_count})")
-                self._deli_instance.emulator.set_vitual_location()
-
-                # 子阶段 5: 同意并继续
-                self._update_step(base_num + 5, total_stages,
-                                  "同意协议并继续...", f"用户签到 ({idx+1}/{user_count})")
-                self._deli_instance.emulator.wait("//android.widget.TextView[@text='同意并继续']").click()
-
-                # 子阶段 6: 进入智能考勤
-                self._update_step(base_num + 6, total_stages,
-                                  "进入智能考勤...", f"用户签到 ({idx+1}/{user_count})")
-                self._deli_instance.emulator.wait("//android.widget.TextView[@text='智能考勤']").click()
-
-                # 子阶段 7: 执行打卡
-                self._update_step(base_num + 7, total_stages,
-                                  "等待打卡范围检测...", f"用户签到 ({idx+1}/{user_count})")
-                start_time = time.time()
-                flag_success = False
-                while True:
-                    self._deli_instance._check_stop()
-                    if time.time() - start_time > 90:
-                        raise TimeoutError("签到超时")
-                    if self._deli_instance.emulator.wait(
-                        "//android.widget.TextView[@text='已在打卡范围内']", timeout=0.3
-                    ).exists():
-                        if not self._deli_instance.debugmode:
-                            self._update_step(base_num + 7, total_stages,
-                                              "执行打卡...", f"用户签到 ({idx+1}/{user_count})")
-                            self._deli_instance.emulator.wait(
-                                "//android.widget.TextView[@text='打卡']", timeout=0.3
-                            ).click()
-                            while True:
-                                self._deli_instance._check_stop()
-                                if self._deli_instance.emulator.wait(
-                                        "//android.widget.ImageView[@resource-id='com.delicloud.app.smartoffice:id/iv_close']",
-                                        timeout=0.3,
-                                    ).exists():
-                                    self._deli_instance.emulator.wait(
-                                            "//android.widget.ImageView[@resource-id='com.delicloud.app.smartoffice:id/iv_close']",
-                                            timeout=0.3,
-                                        ).click()
-                                    self._update_step(base_num + 7, total_stages,
-                                                        f"打卡结果: OK", f"用户签到 ({idx+1}/{user_count})")
-                                    break
-                        else:
-                            self._update_step(base_num + 7, total_stages,
-                                              "调试模式：跳过实际打卡", f"用户签到 ({idx+1}/{user_count})")
-                        break
-                    elif self._deli_instance.emulator.wait(
-                        "//android.widget.TextView[@text='不在打卡范围内']", timeout=0.3
-                    ).exists():
-                        self._update_step(base_num + 7, total_stages,
-                                          "不在打卡范围内，刷新位置...", f"用户签到 ({idx+1}/{user_count})")
-                        self._deli_instance.emulator.wait(
-                            "//android.widget.TextView[@text='刷新']", timeout=0.1
-                        ).click()
-
-                # 子阶段 8: 退出登录
-                self._update_step(base_num + 8, total_stages,
-                                  "退出当前账号...", f"用户签到 ({idx+1}/{user_count})")
-                self._deli_instance._check_stop()
-                self._deli_instance.emulator.wait("//android.widget.TextView[@text='我的']").click()
-                self._deli_instance.emulator.wait("//android.widget.TextView[@text='设置']").click()
-                self._deli_instance.emulator.wait("//android.widget.TextView[@text='退出登录']").click()
-                self._deli_instance.emulator.wait("//android.widget.TextView[@text='确定']").click()
-
-            self._update_step(total_stages, total_stages, "所有用户签到完成", "完成")
-            self.root.after(0, lambda: self._on_sign_finished(True))
-
-        except InterruptedError:
-            self.root.after(0, lambda: self._on_sign_finished(False))
         except Exception as e:
             tb_str = traceback.format_exc()
             self.root.after(0, lambda tb=tb_str, err=e: self._on_sign_finished(False, str(err), tb))
@@ -1322,7 +1229,7 @@ class DeliSignupApp:
         self._field_label(sim_inner, "ADB 序列号")
         self.serial_entry = Win11Entry(sim_inner, placeholder="127.0.0.1:16384", width=38)
         self.serial_entry.pack(fill="x", pady=(4, 12))
-        self.serial_entry.set(cfg.get("serial", "127.0.0.1:16384"))
+        self.serial_entry.set(self._join_list(cfg.get("serial", "127.0.0.1:16384")))
         self.serial_entry.entry.bind("<KeyRelease>", self._on_setting_changed)
         self.serial_entry.entry.bind("<FocusOut>", self._on_setting_changed)
 
@@ -1336,7 +1243,7 @@ class DeliSignupApp:
         self._field_label(num_col, "模拟器编号")
         self.emulator_num_entry = Win11Entry(num_col, placeholder="0", width=20)
         self.emulator_num_entry.pack(fill="x", pady=(4, 0))
-        self.emulator_num_entry.set(str(cfg.get("emulator_num", "0")))
+        self.emulator_num_entry.set(self._join_list(cfg.get("emulator_num", "0")))
         self.emulator_num_entry.entry.bind("<KeyRelease>", self._on_setting_changed)
         self.emulator_num_entry.entry.bind("<FocusOut>", self._on_setting_changed)
 
@@ -1437,6 +1344,63 @@ class DeliSignupApp:
             # 无错误，自动保存
             self._auto_save_settings()
 
+    @staticmethod
+    def _join_list(value) -> str:
+        """配置为列表时（多实例）以逗号分隔显示"""
+        if isinstance(value, (list, tuple)):
+            return ",".join(str(v) for v in value)
+        return str(value)
+
+    @staticmethod
+    def _check_instances(emu_path, serial, emu_num):
+        """用 MuMuManager 的批量查询（带缓存）核对编号是否存在、已启动实例的 ADB 端口是否与序列号一致"""
+        try:
+            infos = MuMuManager.instances(os.path.join(emu_path, "MuMuManager.exe"))
+        except (OSError, ValueError, subprocess.SubprocessError):
+            return []  # 查询失败不影响保存，运行时再报错
+        errors = []
+        serials = [s.strip() for s in serial.split(",")] if serial else []
+        for i, num in enumerate(n.strip() for n in emu_num.split(",")):
+            info = infos.get(str(int(num)))
+            if info is None:
+                errors.append(f"模拟器编号不存在: {num}")
+            elif info.adb_port and i < len(serials) and ":" in serials[i] \
+                    and not serials[i].endswith(f":{info.adb_port}"):
+                errors.append(f"模拟器 {num} 的 ADB 端口为 {info.adb_port}，与序列号 {serials[i]} 不一致")
+        return errors
+
+    def _schedule_instance_check(self, emu_path, serial, emu_num) -> list:
+        """MuMuManager 查询可能耗时数秒，输入停顿 500ms 后在后台线程核对，不阻塞 Tk 线程
+
+        返回这组输入已有的核对结果，尚未核对完成时返回空列表
+        """
+        key = (emu_path, serial, emu_num)
+        if self._instance_check[0] == key:
+            return list(self._instance_check[1])
+        if self._instance_check_job is not None:
+            self.root.after_cancel(self._instance_check_job)
+        self._instance_check_job = self.root.after(500, self._start_instance_check, key)
+        return []
+
+    def _start_instance_check(self, key):
+        self._instance_check_job = None
+
+        def _worker():
+            errors = self._check_instances(*key)
+            self.root.after(0, self._on_instances_checked, key, errors)
+
+        threading.Thread(target=_worker, daemon=True).start()
+
+    def _on_instances_checked(self, key, errors):
+        """在 Tk 线程中接收核对结果，输入已变化时丢弃过期结果"""
+        self._instance_check = (key, errors)
+        if not (hasattr(self, 'settings_error_label') and self.settings_error_label.winfo_exists()):
+            return
+        if key != (self.emulator_path_entry.get(), self.serial_entry.get(), self.emulator_num_entry.get()):
+            return
+        if errors:
+            self.settings_error_label.config(text="\u26a0 " + "；".join(errors))
+
     def _validate_settings(self, show=True):
         """验证所有设置项，返回错误列表。show=True 时更新界面提示"""
         errors = []
@@ -1462,19 +1426,26 @@ class DeliSignupApp:
         if serial and not serial.strip():
             errors.append("ADB 序列号不能为空白")
         elif serial:
-            # 简单格式检查：host:port 或纯数字/字母
-            if ":" in serial:
-                parts = serial.split(":")
-                if len(parts) != 2:
-                    errors.append(f"ADB 序列号格式错误（应为 host:port）: {serial}")
-
-        # 模拟器编号
+            # 简单格式检查：host:port 或纯数字/字母，多个实例用逗号分隔
+            for item in serial.split(","):
+                item = item.strip()
+                if ":" in item:
+                    parts = item.split(":")
+                    if len(parts) != 2:
+                        errors.append(f"ADB 序列号格式错误（应为 host:port）: {item}")
+
+        # 模拟器编号（多个实例用逗号分隔，数量需与序列号一致）
         emu_num = self.emulator_num_entry.get()
         if emu_num:
             try:
-                int(emu_num)
+                [int(n) for n in emu_num.split(",")]
             except ValueError:
                 errors.append("模拟器编号必须为整数")
+            else:
+                if serial and len(serial.split(",")) != len(emu_num.split(",")):
+                    errors.append("模拟器编号数量与 ADB 序列号数量不一致")
+                elif emu_path and not errors:
+                    errors += self._schedule_instance_check(emu_path, serial, emu_num)
 
         # 经纬度
         try: